@@ -20,6 +20,7 @@ import pkgutil
 import importlib
 from pathlib import Path
 from .util.install_requirements import FBW_OT_install_requirements
+from .util.clear_texture_cache import FBW_OT_clear_texture_cache
 
 from io_scene_gltf2.io.com.gltf2_io_extensions import Extension
 
@@ -53,6 +54,62 @@ class FBW_ImporterProperties(bpy.types.PropertyGroup):
         default=True,
     )
 
+    vertex_compaction: bpy.props.EnumProperty(
+        name="Vertex Compaction",
+        description="Only hand the vertices each primitive actually references to Blender, instead of the whole shared vertex buffer",
+        items=(
+            ("NONE", "None", "Keep every primitive pointing at the whole shared vertex buffer"),
+            ("RANGE", "Range", "Slice the shared vertex buffer to the min-max vertex range referenced by each primitive"),
+            ("UNIQUE", "Unique", "Gather only the unique vertices referenced by each primitive"),
+        ),
+        default="NONE",
+    )
+
+    constant_attributes: bpy.props.EnumProperty(
+        name="Constant Attributes",
+        description="What to do with vertex attributes whose values are the same for every vertex, such as the vertex colors MSFS always sets to the same value",
+        items=(
+            ("SHARE", "Share", "Point the attribute of every primitive at a single buffer holding the constant values"),
+            ("DROP", "Drop", "Leave constant attributes out of the imported meshes, so no vertex color layers are created for them"),
+        ),
+        default="SHARE",
+    )
+
+    lazy_textures: bpy.props.BoolProperty(
+        name="Lazy Textures",
+        description="Only convert DDS textures once the importer creates an image that uses them, skipping textures no imported material references. "
+        "Only one decoded texture is held in memory at a time, instead of up to the decoded texture budget of the add-on preferences",
+        default=False,
+    )
+
+    texture_max_size: bpy.props.IntProperty(
+        name="Max Texture Size",
+        description="Import textures at most this many pixels wide and tall, read from a smaller mip level of the DDS file. "
+        "Their full resolution is recorded, so they can be loaded later with File > External Data > Load Full Resolution MSFS Textures. 0 imports textures at full resolution",
+        default=0,
+        min=0,
+        subtype="PIXEL",
+    )
+
+    profile: bpy.props.BoolProperty(
+        name="Profile Import",
+        description="Record per-stage timings of the import, printed as a table and written as JSON and as a Chrome trace",
+        default=False,
+    )
+
+    profile_memory: bpy.props.BoolProperty(
+        name="Track Memory",
+        description="Also record memory high-water marks per stage. This slows the import down noticeably",
+        default=True,
+    )
+
+    profile_path: bpy.props.StringProperty(
+        name="Profile Path",
+        description="JSON file the import profile is written to, the Chrome trace is written next to it. Leave empty to write to the system temporary folder",
+        default="",
+        subtype="FILE_PATH",
+    )
+
 class FBW_AddonPreferences(bpy.types.AddonPreferences):
     bl_idname = __package__
 
@@ -63,9 +120,74 @@ class FBW_AddonPreferences(bpy.types.AddonPreferences):
         subtype='DIR_PATH'
     )
 
+    accessor_cache_size: bpy.props.IntProperty(
+        name='Accessor cache size (MB)',
+        description='Memory budget for decoded accessors shared between primitives during an import. Least recently used accessors are evicted once the budget is exceeded',
+        default=1024,
+        min=0,
+    )
+
+    decode_workers: bpy.props.IntProperty(
+        name='Primitive decoding workers',
+        description='Number of primitives decoded concurrently ahead of the mesh import. 0 uses one worker per CPU core',
+        default=0,
+        min=0,
+    )
+
+    texture_workers: bpy.props.IntProperty(
+        name='Texture conversion workers',
+        description='Number of textures converted concurrently during an import. 0 uses one worker per CPU core',
+        default=0,
+        min=0,
+    )
+
+    decoded_texture_budget: bpy.props.IntProperty(
+        name='Decoded texture budget (MB)',
+        description='Memory the decoded textures of an import may take while they wait for the importer to create their images. '
+        'A 4K texture takes 64 MB. Textures beyond the budget are decoded once their image is created, as with Lazy Textures. 0 is unlimited',
+        default=4096,
+        min=0,
+    )
+
+    texture_cache_enabled: bpy.props.BoolProperty(
+        name='Cache converted textures',
+        description='Keep converted textures on disk so unchanged DDS files are not decoded again on the next import',
+        default=True,
+    )
+
+    texture_cache_dir: bpy.props.StringProperty(
+        name='Texture cache folder',
+        description='Folder holding the converted texture cache. Leave empty to use the system temporary folder',
+        default='',
+        subtype='DIR_PATH'
+    )
+
+    texture_cache_size: bpy.props.IntProperty(
+        name='Texture cache size (MB)',
+        description='Maximum size of the texture cache on disk. Least recently used textures are removed once it is exceeded',
+        default=8192,
+        min=0,
+    )
+
+    texture_cache_hash: bpy.props.BoolProperty(
+        name='Hash texture contents',
+        description='Identify cached textures by a hash of their contents instead of their path, size and modification time. Slower, but shares entries between identical files',
+        default=False,
+    )
+
     def draw(self, context):
         layout = self.layout
         layout.prop(self, 'fs_base_dir', text="fs-base directory")
+        layout.prop(self, 'accessor_cache_size')
+        layout.prop(self, 'decode_workers')
+        layout.prop(self, 'texture_workers')
+        layout.prop(self, 'decoded_texture_budget')
+        layout.prop(self, 'texture_cache_enabled')
+        if self.texture_cache_enabled:
+            layout.prop(self, 'texture_cache_dir')
+            layout.prop(self, 'texture_cache_size')
+            layout.prop(self, 'texture_cache_hash')
+        layout.operator(FBW_OT_clear_texture_cache.bl_idname, icon="TRASH")
         if not FBW_OT_install_requirements.requirements_installed():
             layout.operator(FBW_OT_install_requirements.bl_idname, icon="CONSOLE")
 
@@ -94,6 +216,20 @@ class GLTF_PT_FBWImporterExtensionPanel(bpy.types.Panel):
         layout.use_property_decorate = False  # No animation.
 
         layout.prop(props, "enabled", text="Enabled")
+        layout.prop(props, "vertex_compaction")
+        layout.prop(props, "constant_attributes")
+        layout.prop(props, "lazy_textures")
+        layout.prop(props, "texture_max_size")
+        layout.prop(props, "profile")
+        if props.profile:
+            layout.prop(props, "profile_memory")
+            layout.prop(props, "profile_path")
+
+        # Blender doesn't handle events while an import runs, so the console is the only way to cancel one (see MSFS_ImportProgress)
+        col = layout.column(align=True)
+        col.label(text="Cancel with Ctrl+C in the system console.", icon="INFO")
+        col.label(text="On Windows open it first with Window > Toggle System Console,")
+        col.label(text="on macOS and Linux start Blender from a terminal.")
 
 
 def recursive_module_search(path, root=""):
@@ -0,0 +1,21 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Decoding core of the MSFS import: accessor and primitive decoding and texture conversion, without any dependency on Blender.
+The add-on's io package adapts it to the Khronos importer. Everything in here only imports from within this package, and is
+configured through plain MSFS_Settings objects, so it also runs in benchmarks and scripts outside of Blender.
+"""
@@ -0,0 +1,522 @@
+# msfs-blender-tools, glTF-Blender-IO
+# Copyright (C) 2022 FlyByWire Simulations, The glTF-Blender-IO authors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import mmap
+import weakref
+import threading
+import numpy as np
+from types import SimpleNamespace
+from urllib.parse import unquote
+from collections import OrderedDict
+
+from .msfs_profiler import MSFS_Profiler
+
+
+class ComponentType:
+    """glTF accessor component types, matching the Khronos importer's constants without depending on Blender."""
+
+    Byte = 5120
+    UnsignedByte = 5121
+    Short = 5122
+    UnsignedShort = 5123
+    UnsignedInt = 5125
+    Float = 5126
+
+    @staticmethod
+    def to_numpy_dtype(component_type):
+        """The standard glTF mapping, which is how the Khronos importer reads back the buffers we generate."""
+        return {
+            ComponentType.Byte: np.int8,
+            ComponentType.UnsignedByte: np.uint8,
+            ComponentType.Short: np.int16,
+            ComponentType.UnsignedShort: np.uint16,
+            ComponentType.UnsignedInt: np.uint32,
+            ComponentType.Float: np.float32,
+        }[component_type]
+
+
+class DataType:
+
+    @staticmethod
+    def num_elements(data_type):
+        return {
+            "SCALAR": 1,
+            "VEC2": 2,
+            "VEC3": 3,
+            "VEC4": 4,
+            "MAT2": 4,
+            "MAT3": 9,
+            "MAT4": 16,
+        }[data_type]
+
+
+class MSFS_AccessorCache:
+    """
+    Per-import cache of decoded accessors, bounded by a byte budget with least recently used eviction.
+    Asobo shares index and vertex accessors between many primitives, so these are cached automatically.
+    Safe to use from worker threads.
+    """
+
+    def __init__(self, max_bytes, shared_accessors=()):
+        self.lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.shared_accessors = set(shared_accessors)
+        self.arrays = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, accessor_idx):
+        with self.lock:
+            array = self.arrays.get(accessor_idx)
+            if array is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.arrays.move_to_end(accessor_idx)
+            return array
+
+    def put(self, accessor_idx, array):
+        if array.nbytes > self.max_bytes:
+            return
+
+        # Prevent accidentally modifying cached arrays
+        array.flags.writeable = False
+
+        with self.lock:
+            if accessor_idx in self.arrays:
+                return # Decoded concurrently by another worker
+
+            self.arrays[accessor_idx] = array
+            self.bytes += array.nbytes
+
+            while self.bytes > self.max_bytes:
+                _, evicted = self.arrays.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class MSFS_BufferArena:
+    """
+    Growable byte buffer packing decoded arrays back to back, at offsets aligned for any glTF component type.
+    Capacity grows geometrically, so appending is amortized O(1). Arrays already read from the arena keep the previous storage alive.
+    """
+
+    Alignment = 4
+
+    def __init__(self, capacity=0):
+        self.data = np.empty(capacity, dtype=np.uint8)
+        self.size = 0
+
+    def reserve(self, byte_length):
+        """Makes sure byte_length more bytes (plus alignment) fit without growing again."""
+        required = self.size + byte_length + MSFS_BufferArena.Alignment
+        if required > len(self.data):
+            data = np.empty(max(required, len(self.data) * 2), dtype=np.uint8)
+            data[: self.size] = self.data[: self.size]
+            self.data = data
+
+    def append(self, array, dtype=None):
+        """
+        Copies array into the arena, converting it to dtype on the way, and returns its byte offset and length.
+        The conversion happens while copying, so no converted temporary is allocated.
+        """
+        dtype = np.dtype(dtype or array.dtype)
+        byte_length = array.size * dtype.itemsize
+        self.reserve(byte_length)
+
+        offset = self.size + (-self.size % MSFS_BufferArena.Alignment)
+        np.copyto(
+            self.data[offset : offset + byte_length].view(dtype).reshape(array.shape),
+            array,
+            casting="unsafe",
+        )
+        self.size = offset + byte_length
+
+        return offset, byte_length
+
+    def view(self):
+        """Returns the arena contents as a flat byte memoryview, which is what glTF buffers are sliced from."""
+        return memoryview(self.data)
+
+
+class MSFS_Binary:
+
+    # Mappings unmap_buffers could not close yet, as weak references so they are still unmapped once garbage collected
+    lingering_mappings = []
+
+    # Bytes of interleaved vertex data de-interleaved at once, small enough for a block to stay in the CPU cache while all its attributes are copied out
+    DeinterleaveBlockBytes = 256 * 1024
+
+    # Divisor of each normalized component type, and whether the result is clamped to -1
+    NormalizationDivisors = {
+        ComponentType.Byte: (127.0, True),
+        ComponentType.UnsignedByte: (255.0, False),
+        ComponentType.Short: (32767.0, True),
+        ComponentType.UnsignedShort: (65535.0, False),
+    }
+
+    @staticmethod
+    def to_numpy_dtype(component_type):
+        return {
+            ComponentType.Byte: np.int8,
+            ComponentType.UnsignedByte: np.uint8,
+            ComponentType.Short: np.float16,  # Asobo uses a float16 for shorts instead of int16
+            ComponentType.UnsignedShort: np.uint16,
+            ComponentType.UnsignedInt: np.uint32,
+            ComponentType.Float: np.float32,
+        }[component_type]
+
+    @staticmethod
+    def map_buffers(gltf):
+        """
+        Memory-maps the external .bin buffers of the glTF into gltf.buffers, before anything loads them as a whole.
+        Accessors are then decoded as zero-copy views over the mapped file, and only the pages actually read become resident.
+        Returns the number of bytes mapped.
+        """
+        mapped_bytes = 0
+        for buffer_idx, buffer in enumerate(gltf.data.buffers or []):
+            # Embedded (data URI) and GLB buffers are left to the importer
+            if buffer_idx in gltf.buffers or not buffer.uri or buffer.uri.startswith("data:"):
+                continue
+
+            path = os.path.join(os.path.dirname(gltf.filename), unquote(buffer.uri))
+            try:
+                with open(path, "rb") as f:
+                    # The mapping stays valid once the file is closed, and is unmapped when the last view of it is released
+                    mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                continue # Missing or empty files are reported by the importer as usual
+
+            gltf.buffers[buffer_idx] = memoryview(mapping)
+            if not hasattr(gltf, "msfs_mapped_buffers"):
+                gltf.msfs_mapped_buffers = {}
+            gltf.msfs_mapped_buffers[buffer_idx] = mapping
+            mapped_bytes += len(mapping)
+
+        return mapped_bytes
+
+    @staticmethod
+    def unmap_buffers(gltf):
+        """
+        Closes the mappings of map_buffers once the import is done with them, so the .bin files aren't kept open (and locked on Windows).
+        A mapping can't be closed while arrays viewing it are still alive. Those are retried by the next call, and are otherwise
+        unmapped once the last view is released. Returns the number of mappings left open.
+        """
+        mappings = [mapping for mapping in (ref() for ref in MSFS_Binary.lingering_mappings) if mapping is not None]
+        for buffer_idx, mapping in getattr(gltf, "msfs_mapped_buffers", {}).items():
+            buffer = gltf.buffers.pop(buffer_idx, None)
+            if isinstance(buffer, memoryview):
+                try:
+                    buffer.release()
+                except BufferError:
+                    pass # Arrays were created straight from it, the mapping stays open until they are released
+            mappings.append(mapping)
+        if hasattr(gltf, "msfs_mapped_buffers"):
+            del gltf.msfs_mapped_buffers
+
+        lingering = []
+        for mapping in mappings:
+            try:
+                mapping.close()
+            except BufferError:
+                lingering.append(weakref.ref(mapping))
+        MSFS_Binary.lingering_mappings = lingering
+
+        return len(lingering)
+
+    @staticmethod
+    def get_buffer_view(gltf, buffer_view_idx):
+        """Returns the bytes of a buffer view, loading its buffer through the glTF importer if it was not loaded yet."""
+        buffer_view = gltf.data.buffer_views[buffer_view_idx]
+        if buffer_view.buffer not in gltf.buffers:
+            gltf.load_buffer(buffer_view.buffer)
+
+        buffer = gltf.buffers[buffer_view.buffer]
+        byte_offset = buffer_view.byte_offset or 0
+        return buffer[byte_offset : byte_offset + buffer_view.byte_length]
+
+    @staticmethod
+    def create_accessor_cache(gltf, max_bytes, shared_accessors=()):
+        """Sets up the accessor cache for this import, sized to max_bytes."""
+        gltf.msfs_accessor_cache = MSFS_AccessorCache(max_bytes, shared_accessors)
+        return gltf.msfs_accessor_cache
+
+    @staticmethod
+    def decode_accessor(gltf, accessor_idx, cache=None):
+        """
+        Decodes accessor to 2D numpy array (count x num_components).
+        When cache is None, the accessor is cached if it is shared between primitives.
+        """
+        accessor_cache = getattr(gltf, "msfs_accessor_cache", None)
+        if accessor_cache is not None:
+            if cache is None:
+                cache = accessor_idx in accessor_cache.shared_accessors
+
+            if cache:
+                array = accessor_cache.get(accessor_idx)
+                if array is not None:
+                    return array
+
+        accessor = gltf.data.accessors[accessor_idx]
+        with MSFS_Profiler.stage(gltf, "decode_accessor", accessor.name) as stage:
+            array = MSFS_Binary.decode_accessor_obj(gltf, accessor)
+            stage.bytes = array.nbytes
+
+        if cache and accessor_cache is not None:
+            accessor_cache.put(accessor_idx, array)
+
+        return array
+
+    @staticmethod
+    def interleaved_groups(gltf, accessor_indices):
+        """
+        Groups accessors reading the same interleaved (strided) buffer view, so they can be decoded together by decode_interleaved.
+        Returns a list of accessor index lists, with one list per buffer view read by at least two of the accessors.
+        """
+        groups = {}
+        for accessor_idx in accessor_indices:
+            accessor = gltf.data.accessors[accessor_idx]
+            if accessor.buffer_view is None or accessor.sparse or accessor.type in ["MAT2", "MAT3"]:
+                continue
+
+            stride = gltf.data.buffer_views[accessor.buffer_view].byte_stride
+            element_size = np.dtype(MSFS_Binary.to_numpy_dtype(accessor.component_type)).itemsize * DataType.num_elements(accessor.type)
+            if stride and stride != element_size:
+                groups.setdefault(accessor.buffer_view, []).append(accessor_idx)
+
+        return [group for group in groups.values() if len(group) > 1]
+
+    @staticmethod
+    def element_unit(element_size):
+        """Returns a dtype holding a whole element (all components of a vertex) of element_size bytes, copied as a single value."""
+        return {1: np.uint8, 2: np.uint16, 4: np.uint32, 8: np.uint64}.get(element_size, np.dtype(f"V{element_size}"))
+
+    @staticmethod
+    def decode_interleaved(gltf, accessor_indices, cache=None):
+        """
+        Decodes accessors interleaved in the same strided buffer view in a single pass. Returns {accessor index: array}, with the arrays
+        decoded like decode_accessor_obj but contiguous.
+        The buffer view is read as records of a structured dtype with one field per accessor, each holding a whole element as a single
+        value (see element_unit), so every field is copied with one strided copy instead of one per component. The records are copied
+        out in blocks of DeinterleaveBlockBytes, so every block is still in the CPU cache while each of its fields is copied out.
+        Accessors are cached like decode_accessor does.
+        """
+        accessor_cache = getattr(gltf, "msfs_accessor_cache", None)
+
+        def cached(accessor_idx):
+            if accessor_cache is None:
+                return False
+            return cache if cache is not None else accessor_idx in accessor_cache.shared_accessors
+
+        arrays = {}
+        for accessor_idx in accessor_indices:
+            array = accessor_cache.get(accessor_idx) if cached(accessor_idx) else None
+            if array is not None:
+                arrays[accessor_idx] = array
+
+        decoded_indices = [accessor_idx for accessor_idx in accessor_indices if accessor_idx not in arrays]
+        if not decoded_indices:
+            return arrays
+
+        accessors = [gltf.data.accessors[accessor_idx] for accessor_idx in decoded_indices]
+        buffer_view_idx = accessors[0].buffer_view
+        stride = gltf.data.buffer_views[buffer_view_idx].byte_stride
+        buffer_data = MSFS_Binary.get_buffer_view(gltf, buffer_view_idx)
+
+        with MSFS_Profiler.stage(gltf, "decode_interleaved", f"bufferView {buffer_view_idx}") as stage:
+            dtypes = [np.dtype(MSFS_Binary.to_numpy_dtype(accessor.component_type)).newbyteorder("<") for accessor in accessors]
+            component_counts = [DataType.num_elements(accessor.type) for accessor in accessors]
+            element_sizes = [dtype.itemsize * component_nb for dtype, component_nb in zip(dtypes, component_counts)]
+
+            # The record only spans the fields, so the last vertex may end before a full stride
+            first_offset = min(accessor.byte_offset or 0 for accessor in accessors)
+            offsets = [(accessor.byte_offset or 0) - first_offset for accessor in accessors]
+            record_dtype = np.dtype(
+                {
+                    "names": [f"f{idx}" for idx in range(len(accessors))],
+                    "formats": [MSFS_Binary.element_unit(element_size) for element_size in element_sizes],
+                    "offsets": offsets,
+                    "itemsize": max(offset + element_size for offset, element_size in zip(offsets, element_sizes)),
+                }
+            )
+            count = max(accessor.count for accessor in accessors)
+            records = np.ndarray((count,), dtype=record_dtype, buffer=buffer_data, offset=first_offset, strides=(stride,))
+
+            outputs = [
+                np.empty((accessor.count, component_nb), dtype=np.float32 if accessor.normalized else dtype)
+                for accessor, dtype, component_nb in zip(accessors, dtypes, component_counts)
+            ]
+            block_rows = max(1, MSFS_Binary.DeinterleaveBlockBytes // stride)
+            # Normalized accessors are copied to a scratch block first, and normalized from there into their output
+            scratches = [
+                np.empty(block_rows * element_size, dtype=np.uint8) if accessor.normalized else None
+                for accessor, element_size in zip(accessors, element_sizes)
+            ]
+
+            for first_row in range(0, count, block_rows):
+                block = records[first_row : first_row + block_rows]
+                for idx, (accessor, output, scratch) in enumerate(zip(accessors, outputs, scratches)):
+                    rows = min(len(block), accessor.count - first_row)
+                    if rows <= 0:
+                        continue
+
+                    elements = block[f"f{idx}"][:rows]
+                    if scratch is None:
+                        output[first_row : first_row + rows].reshape(-1).view(record_dtype[idx])[...] = elements
+                    else:
+                        raw = scratch[: rows * element_sizes[idx]].view(record_dtype[idx])
+                        raw[...] = elements
+                        MSFS_Binary.normalize(
+                            raw.view(dtypes[idx]).reshape(rows, component_counts[idx]),
+                            accessor.component_type,
+                            output[first_row : first_row + rows],
+                        )
+
+            stage.bytes = sum(output.nbytes for output in outputs)
+
+        for accessor_idx, output in zip(decoded_indices, outputs):
+            if cached(accessor_idx):
+                accessor_cache.put(accessor_idx, output)
+            arrays[accessor_idx] = output
+
+        return arrays
+
+    @staticmethod
+    def decode_accessor_obj(gltf, accessor):
+        # MAT2/3 have special alignment requirements that aren't handled. But it
+        # doesn't matter because nothing uses them.
+        assert accessor.type not in ["MAT2", "MAT3"]
+
+        dtype = MSFS_Binary.to_numpy_dtype(accessor.component_type)
+        component_nb = DataType.num_elements(accessor.type)
+
+        if accessor.buffer_view is not None:
+            bufferView = gltf.data.buffer_views[accessor.buffer_view]
+            buffer_data = MSFS_Binary.get_buffer_view(gltf, accessor.buffer_view)
+
+            accessor_offset = accessor.byte_offset or 0
+            buffer_data = buffer_data[accessor_offset:]
+
+            bytes_per_elem = dtype(1).nbytes
+            default_stride = bytes_per_elem * component_nb
+            stride = bufferView.byte_stride or default_stride
+
+            if stride == default_stride:
+                array = np.frombuffer(
+                    buffer_data,
+                    dtype=np.dtype(dtype).newbyteorder("<"),
+                    count=accessor.count * component_nb,
+                )
+                array = array.reshape(accessor.count, component_nb)
+
+            else:
+                # The data looks like
+                #   XXXppXXXppXXXppXXX
+                # where X are the components and p are padding.
+                # One XXXpp group is one stride's worth of data.
+                assert stride % bytes_per_elem == 0
+                elems_per_stride = stride // bytes_per_elem
+                num_elems = (accessor.count - 1) * elems_per_stride + component_nb
+
+                array = np.frombuffer(
+                    buffer_data,
+                    dtype=np.dtype(dtype).newbyteorder("<"),
+                    count=num_elems,
+                )
+                assert array.strides[0] == bytes_per_elem
+                array = np.lib.stride_tricks.as_strided(
+                    array,
+                    shape=(accessor.count, component_nb),
+                    strides=(stride, bytes_per_elem),
+                )
+
+        else:
+            # No buffer view; initialize to zeros
+            array = np.zeros((accessor.count, component_nb), dtype=dtype)
+
+        if accessor.sparse:
+            sparse_indices_obj = SimpleNamespace(
+                count=accessor.sparse.count,
+                buffer_view=accessor.sparse.indices.buffer_view,
+                byte_offset=accessor.sparse.indices.byte_offset or 0,
+                component_type=accessor.sparse.indices.component_type,
+                type="SCALAR",
+                sparse=None,
+                normalized=None,
+            )
+            sparse_indices = MSFS_Binary.decode_accessor_obj(
+                gltf, sparse_indices_obj
+            )
+            sparse_indices = sparse_indices.reshape(len(sparse_indices))
+
+            sparse_values_obj = SimpleNamespace(
+                count=accessor.sparse.count,
+                buffer_view=accessor.sparse.values.buffer_view,
+                byte_offset=accessor.sparse.values.byte_offset or 0,
+                component_type=accessor.component_type,
+                type=accessor.type,
+                sparse=None,
+                normalized=None,
+            )
+            sparse_values = MSFS_Binary.decode_accessor_obj(
+                gltf, sparse_values_obj
+            )
+
+            if not array.flags.writeable:
+                array = array.copy()
+            array[sparse_indices] = sparse_values
+
+        # Normalization
+        if accessor.normalized:
+            array = MSFS_Binary.normalize(array, accessor.component_type)
+
+        return array
+
+    @staticmethod
+    def normalize(array, component_type, out=None):
+        """
+        Converts normalized components to float32 in a single pass, straight into a preallocated output array, or into out if given.
+        Dividing in float32 rounds exactly like dividing in float64 and rounding the quotient to float32, so no float64 temporaries
+        are needed. Asobo's float16 "Short" components keep being divided in float16, only their output is widened while it is written.
+        """
+        if component_type not in MSFS_Binary.NormalizationDivisors:
+            if out is None:
+                return array.astype(np.float32, copy=False)
+            out[...] = array
+            return out
+
+        divisor, signed = MSFS_Binary.NormalizationDivisors[component_type]
+        compute_dtype = np.float16 if array.dtype == np.float16 else np.float32
+
+        normalized = np.empty(array.shape, dtype=np.float32) if out is None else out
+        np.divide(array, compute_dtype(divisor), out=normalized, dtype=compute_dtype)
+        if signed:
+            np.maximum(normalized, np.float32(-1.0), out=normalized)
+
+        return normalized
\ No newline at end of file
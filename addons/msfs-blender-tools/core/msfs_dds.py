@@ -0,0 +1,142 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import struct
+
+
+class MSFS_DDS:
+    """
+    Reads the header of a DDS file, and single mip levels out of it without reading the levels before or after them.
+    A level is returned as a complete single-level DDS file, so any DDS decoder (PIL) decodes it like a full resolution texture.
+    """
+
+    Magic = b"DDS "
+    HeaderSize = 128 # Magic and DDS_HEADER
+    DX10HeaderSize = 20
+
+    # DDS_HEADER flags, pixel format flags and caps
+    MipMapCountFlag = 0x20000
+    FourCCFlag = 0x4
+    CubeMapCaps = 0x200
+    VolumeCaps = 0x200000
+
+    # Bytes per 4x4 block of the block compressed formats
+    FourCCBlockBytes = {
+        b"DXT1": 8,
+        b"DXT2": 16,
+        b"DXT3": 16,
+        b"DXT4": 16,
+        b"DXT5": 16,
+        b"ATI1": 8,
+        b"BC4U": 8,
+        b"BC4S": 8,
+        b"ATI2": 16,
+        b"BC5U": 16,
+        b"BC5S": 16,
+    }
+    DXGIBlockBytes = {
+        **{dxgi_format: 8 for dxgi_format in (70, 71, 72, 79, 80, 81)}, # BC1, BC4
+        **{dxgi_format: 16 for dxgi_format in (73, 74, 75, 76, 77, 78, 82, 83, 84, 94, 95, 96, 97, 98, 99)}, # BC2, BC3, BC5, BC6H, BC7
+    }
+    DXGIBitsPerPixel = {dxgi_format: 32 for dxgi_format in (27, 28, 29, 87, 88, 90, 91)} # R8G8B8A8, B8G8R8A8, B8G8R8X8
+
+    def __init__(self, path, header, width, height, mip_count, block_bytes=None, bits_per_pixel=None):
+        self.path = path
+        self.header = header # Magic, DDS_HEADER and DX10 header if any
+        self.width = width
+        self.height = height
+        self.mip_count = mip_count
+        self.block_bytes = block_bytes
+        self.bits_per_pixel = bits_per_pixel
+
+    @staticmethod
+    def open(path):
+        """Reads the header of a DDS file. Returns None if the file isn't a plain 2D DDS texture, such as cube maps and texture arrays."""
+        with open(path, "rb") as f:
+            header = f.read(MSFS_DDS.HeaderSize)
+            if len(header) < MSFS_DDS.HeaderSize or header[:4] != MSFS_DDS.Magic:
+                return None
+
+            flags, height, width = struct.unpack_from("<3I", header, 8)
+            depth, mip_count = struct.unpack_from("<2I", header, 24)
+            pixel_format_flags, four_cc, bit_count = struct.unpack_from("<I4sI", header, 80)
+            caps2 = struct.unpack_from("<I", header, 112)[0]
+            if caps2 & (MSFS_DDS.CubeMapCaps | MSFS_DDS.VolumeCaps):
+                return None
+
+            block_bytes = None
+            bits_per_pixel = None
+            if pixel_format_flags & MSFS_DDS.FourCCFlag and four_cc == b"DX10":
+                dx10_header = f.read(MSFS_DDS.DX10HeaderSize)
+                if len(dx10_header) < MSFS_DDS.DX10HeaderSize:
+                    return None
+                dxgi_format, _, _, array_size = struct.unpack_from("<4I", dx10_header)
+                if array_size > 1:
+                    return None
+                header += dx10_header
+                block_bytes = MSFS_DDS.DXGIBlockBytes.get(dxgi_format)
+                bits_per_pixel = MSFS_DDS.DXGIBitsPerPixel.get(dxgi_format)
+            elif pixel_format_flags & MSFS_DDS.FourCCFlag:
+                block_bytes = MSFS_DDS.FourCCBlockBytes.get(four_cc)
+            else:
+                bits_per_pixel = bit_count or None
+
+        mip_count = mip_count if flags & MSFS_DDS.MipMapCountFlag and mip_count > 0 else 1
+        return MSFS_DDS(path, header, width, height, mip_count, block_bytes, bits_per_pixel)
+
+    def level_dimensions(self, level):
+        return max(1, self.width >> level), max(1, self.height >> level)
+
+    def level_size(self, level):
+        """Returns the size of a mip level in bytes, or None for pixel formats this reader doesn't know."""
+        width, height = self.level_dimensions(level)
+        if self.block_bytes is not None:
+            return ((width + 3) // 4) * ((height + 3) // 4) * self.block_bytes
+        if self.bits_per_pixel is not None:
+            return (width * self.bits_per_pixel + 7) // 8 * height
+        return None
+
+    def level_for(self, max_size):
+        """Returns the number of times the texture has to be halved to be at most max_size pixels wide and tall, whether or not the file has that mip level."""
+        level = 0
+        while max(self.level_dimensions(level)) > max_size and max(self.level_dimensions(level)) > 1:
+            level += 1
+        return level
+
+    def read_level(self, level):
+        """Returns a mip level of the texture as a single-level DDS file, or None if the file has no such level or an unknown pixel format."""
+        if level >= self.mip_count:
+            return None
+
+        level_size = self.level_size(level)
+        if level_size is None:
+            return None
+        offset = len(self.header) + sum(self.level_size(previous_level) for previous_level in range(level))
+
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read(level_size)
+        if len(data) < level_size:
+            return None
+
+        # Describe the level as the only level of the texture
+        width, height = self.level_dimensions(level)
+        header = bytearray(self.header)
+        struct.pack_into("<2I", header, 12, height, width)
+        struct.pack_into("<I", header, 20, level_size if self.block_bytes is not None else (width * self.bits_per_pixel + 7) // 8)
+        struct.pack_into("<I", header, 28, 1)
+
+        return bytes(header) + data
@@ -0,0 +1,40 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class MSFS_Executor:
+    """Worker thread pools shared between imports, one per kind of work. A pool is only recreated when its size changes."""
+
+    _executors = {} # Name -> (workers, ThreadPoolExecutor)
+
+    @staticmethod
+    def get(name, workers):
+        executor = MSFS_Executor._executors.get(name)
+        if executor is None or executor[0] != workers:
+            if executor is not None:
+                executor[1].shutdown()
+            executor = (workers, ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"msfs-{name}"))
+            MSFS_Executor._executors[name] = executor
+
+        return executor[1]
+
+    @staticmethod
+    def shutdown():
+        for _, executor in MSFS_Executor._executors.values():
+            executor.shutdown()
+        MSFS_Executor._executors.clear()
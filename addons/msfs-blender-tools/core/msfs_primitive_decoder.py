@@ -0,0 +1,339 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from .msfs_binary import ComponentType, DataType, MSFS_Binary
+
+
+class MSFS_PrimitiveDecoder:
+    """Decoding of ASOBO_primitive primitives to plain NumPy arrays. Registering the results with the glTF importer is up to the caller."""
+
+    SerializedName = "ASOBO_primitive"
+
+    # Attributes whose converted values don't depend on the source data, by attribute prefix: (value, component type)
+    ConstantAttributes = {
+        "COLOR": (15360, ComponentType.UnsignedShort), # MSFS always sets vertex colors to 15360
+    }
+
+    @staticmethod
+    def find_shared_accessors(gltf):
+        """Returns the accessors referenced by more than one ASOBO_primitive primitive."""
+        references = {}
+        for gltf_mesh in gltf.data.meshes or []:
+            for gltf_prim in gltf_mesh.primitives:
+                if (
+                    gltf_prim.extras is None
+                    or MSFS_PrimitiveDecoder.SerializedName not in gltf_prim.extras
+                ):
+                    continue
+
+                accessors = set(gltf_prim.attributes.values())
+                if gltf_prim.indices is not None:
+                    accessors.add(gltf_prim.indices)
+                for accessor_idx in accessors:
+                    references[accessor_idx] = references.get(accessor_idx, 0) + 1
+
+        return {accessor_idx for accessor_idx, count in references.items() if count > 1}
+
+    @staticmethod
+    def primitive_range(extension):
+        """Returns the start index, primitive count and base vertex index of a primitive in the shared buffers."""
+        # While it would be more efficient to do `extension.get(PROPERTY, 0)`, unfortunately there are cases where the key is present but with a null value
+        return (
+            extension.get("StartIndex") or 0,
+            extension.get("PrimitiveCount") or 0,
+            extension.get("BaseVertexIndex") or 0,
+        )
+
+    @staticmethod
+    def attribute_conversion(attr, extension):
+        """Returns a key describing how an attribute is converted, so identically converted accessors can be shared."""
+        conversion = attr.split("_")[0]
+        if conversion in ["JOINTS", "WEIGHTS"]:
+            # BLEND1 primitives get their joints and weights padded
+            return (conversion, extension.get("VertexType") == "BLEND1")
+        return (conversion,)
+
+    @staticmethod
+    def constant_attribute(attr):
+        """Returns the (value, component type) every vertex of a constant attribute converts to, or None if the attribute carries actual data."""
+        return MSFS_PrimitiveDecoder.ConstantAttributes.get(attr.split("_")[0])
+
+    @staticmethod
+    def constant_key(attr, component_count, count, normalized):
+        """
+        Returns the key under which a constant attribute is shared between primitives. Its values are known without reading the
+        source accessor, so any primitives with as many vertices share it, whichever accessor and vertex range they come from,
+        as long as the accessor properties the constant keeps (normalized) match.
+        """
+        return ("constant", attr.split("_")[0], component_count, count, normalized)
+
+    @staticmethod
+    def is_constant_key(key):
+        return key is not None and key[0] == "constant"
+
+    @staticmethod
+    def attribute_key(accessor_idx, attr, extension, vertices):
+        """
+        Returns the key under which a decoded attribute can be shared between primitives: its source accessor, conversion and vertex range.
+        Returns None for attributes gathered from a unique vertex set, which are specific to a single primitive.
+        """
+        if vertices is None:
+            return (accessor_idx, MSFS_PrimitiveDecoder.attribute_conversion(attr, extension))
+        if isinstance(vertices, slice):
+            return (accessor_idx, MSFS_PrimitiveDecoder.attribute_conversion(attr, extension), vertices.start, vertices.stop)
+        return None
+
+    @staticmethod
+    def decode_indices(indices, start_index, primitive_count, base_vertex_index, vertex_compaction="NONE"):
+        """
+        Slice the indices of a single primitive out of the shared index buffer, rebase them onto the shared vertex buffer,
+        flip the face winding and narrow them to the smallest fitting index type. All of this is done in one vectorized pass.
+
+        With vertex compaction enabled the indices are remapped to only the vertices the primitive references, either the
+        min-max vertex range ("RANGE") or the unique set of vertices ("UNIQUE"). The selected vertices are returned as a slice
+        or index array into the shared vertex buffer, or None if the primitive references the whole buffer.
+        """
+        faces = indices[start_index : (start_index + (primitive_count * 3))].reshape(-1, 3)
+
+        vertices = None
+        index_offset = base_vertex_index
+        max_index = (int(faces.max()) if len(faces) else 0) + base_vertex_index
+        if len(faces) and vertex_compaction == "RANGE":
+            first_vertex = int(faces.min())
+            vertices = slice(first_vertex + base_vertex_index, max_index + 1)
+            index_offset = -first_vertex
+            max_index -= first_vertex + base_vertex_index
+        elif len(faces) and vertex_compaction == "UNIQUE":
+            vertices, faces = np.unique(faces, return_inverse=True)
+            vertices = vertices.astype(np.int64) + base_vertex_index
+            faces = faces.reshape(-1, 3)
+            index_offset = 0
+            max_index = len(vertices) - 1
+
+        # Set correct data type
+        if max_index < 65535:
+            component_type = ComponentType.UnsignedShort
+        elif max_index < 4294967295:
+            component_type = ComponentType.UnsignedInt
+        else:
+            raise OverflowError(f"Index {max_index} does not fit in an unsigned int")
+        dtype = ComponentType.to_numpy_dtype(component_type)
+
+        # We have to flip face vertex order. For example: a face with indices [1, 2, 3] will become [3, 2, 1]. We need to do this to ensure the normals are facing the correct way
+        # Reading the faces backwards while applying the index offset writes the rebased, flipped and narrowed indices in one go
+        new_indices = np.empty(faces.shape, dtype=dtype)
+        if index_offset >= 0:
+            np.add(faces[:, ::-1], index_offset, out=new_indices, dtype=dtype, casting="unsafe")
+        else:
+            np.subtract(faces[:, ::-1], -index_offset, out=new_indices, dtype=faces.dtype, casting="unsafe")
+
+        return new_indices.reshape(-1), component_type, vertices
+
+    @staticmethod
+    def convert_attribute(attr, data, extension):
+        """
+        Converts the decoded data of an attribute to what Blender expects.
+        Returns the converted data and the accessor properties which changed. The returned array may be a view of data, or data
+        itself, and still has to be cast to the standard glTF type of the accessor's component type (see ComponentType.to_numpy_dtype).
+        """
+        properties = {}
+
+        # Handle certain attributes
+        # TODO: color, tangent, texcoord, normal?
+        if attr == "NORMAL":
+            # For some reason the normal attribute has a 4th value - we only need three. TODO: figure out what to do with last normal value
+            data = data[:, :-1]
+            # Since we flipped indices order, flip normals
+            data = np.negative(data)
+            properties["type"] = "VEC3"
+        elif attr.startswith("COLOR_"):
+            # Disregard all previous values - MSFS always sets these values to 15360. Every row is a view of the same value
+            value, component_type = MSFS_PrimitiveDecoder.constant_attribute(attr)
+            data = np.broadcast_to(np.array(value, dtype=ComponentType.to_numpy_dtype(component_type)), data.shape)
+            properties["component_type"] = component_type
+        elif attr.startswith("TEXCOORD_"):
+            properties["component_type"] = ComponentType.Float
+        elif attr.startswith("JOINTS_"):
+            # Joint data needs to have 4 values - BLEND1 primitives only have 1
+            if extension.get("VertexType") == "BLEND1":
+                data = np.pad(data, (0, 4 - data.shape[1]))
+            properties["type"] = "VEC4"
+        elif attr.startswith("WEIGHTS_"):
+            # Weight data needs to have 4 values - BLEND1 primitives only have 1
+            if extension.get("VertexType") == "BLEND1":
+                data = np.pad(data, (0, 4 - data.shape[1]))
+            properties["type"] = "VEC4"
+            properties["normalized"] = None
+            properties["component_type"] = ComponentType.Float
+
+        return data, properties
+
+    @staticmethod
+    def decode_primitives(gltf, primitives, vertex_compaction="NONE", executor=None, decoded_keys=(), progress=None):
+        """
+        Decodes the indices and attributes of many (gltf_mesh, gltf_prim) primitives at once, so they can be installed later.
+        The work is spread over executor if one is given. Every source accessor, and every attribute shared between primitives,
+        is only decoded once. Attributes whose key is in decoded_keys were decoded before and are skipped.
+        Each step is reported to progress (see MSFS_Progress) if one is given, which may cancel the decoding between work items.
+
+        Constant attributes (see constant_attribute) are never read from their source accessor. Their data is a read-only view
+        repeating the constant value, under a key recognized by is_constant_key.
+
+        Returns {gltf_prim: (new_indices, component_type, {attr: (key, data, properties)})}, with data and the accessor properties
+        which changed, or None for skipped attributes.
+        """
+        def map_tasks(stage, func, items, measure):
+            results = executor.map(func, items) if executor is not None else map(func, items)
+            if progress is not None:
+                results = progress.track(stage, results, len(items), measure)
+            return results
+
+        primitives = [
+            (gltf_mesh, gltf_prim)
+            for gltf_mesh, gltf_prim in primitives
+            if gltf_prim.extras is not None
+            and MSFS_PrimitiveDecoder.SerializedName in gltf_prim.extras
+            and gltf_prim.indices is not None
+        ]
+
+        def decode_sources(stage, accessor_indices, deinterleave=()):
+            # Each source accessor is decoded by a single task, so workers never decode the same accessor twice.
+            # Accessors in deinterleave which are interleaved in the same buffer view share a task, which de-interleaves them
+            # all in one pass. The others stay strided views of the buffer, which are only copied once when they are installed
+            accessor_indices = list(dict.fromkeys(accessor_indices))
+            groups = MSFS_Binary.interleaved_groups(gltf, [idx for idx in accessor_indices if idx in deinterleave])
+            grouped = {accessor_idx for group in groups for accessor_idx in group}
+            source_tasks = groups + [[accessor_idx] for accessor_idx in accessor_indices if accessor_idx not in grouped]
+
+            def decode_source(task):
+                if len(task) > 1:
+                    return MSFS_Binary.decode_interleaved(gltf, task)
+                return {task[0]: MSFS_Binary.decode_accessor(gltf, task[0])}
+
+            sources = {}
+            for arrays in map_tasks(
+                stage, decode_source, source_tasks, lambda arrays: sum(data.nbytes for data in arrays.values())
+            ):
+                sources.update(arrays)
+            return sources
+
+        index_sources = decode_sources("index buffers", (gltf_prim.indices for _, gltf_prim in primitives))
+
+        def decode_primitive_indices(primitive):
+            gltf_mesh, gltf_prim = primitive
+            extension = gltf_prim.extras[MSFS_PrimitiveDecoder.SerializedName]
+            indices = index_sources[gltf_prim.indices]
+            try:
+                return MSFS_PrimitiveDecoder.decode_indices(
+                    indices.reshape(len(indices)),
+                    *MSFS_PrimitiveDecoder.primitive_range(extension),
+                    vertex_compaction,
+                )
+            except OverflowError:
+                raise RuntimeError(
+                    f"Mesh {gltf_mesh.name} contains too many vertices"
+                )  # Not sure if this will ever happen, but check just in case
+
+        decoded_indices = list(map_tasks("primitives", decode_primitive_indices, primitives, lambda result: result[0].nbytes))
+        del index_sources
+
+        # Gather the attributes to decode, sharing identical ones between primitives
+        tasks = {} # Task key -> (accessor index, attribute, extension, vertices)
+        constants = {} # Task key -> (data, properties) of constant attributes, which need no decoding
+        primitive_tasks = [] # Per primitive: {attribute: (key, task key)}
+        for (_, gltf_prim), (_, _, vertices) in zip(primitives, decoded_indices):
+            extension = gltf_prim.extras[MSFS_PrimitiveDecoder.SerializedName]
+            attributes = {}
+            for attr, accessor_idx in gltf_prim.attributes.items():
+                constant = MSFS_PrimitiveDecoder.constant_attribute(attr)
+                if constant is not None:
+                    accessor = gltf.data.accessors[accessor_idx]
+                    if vertices is None:
+                        count = accessor.count
+                    elif isinstance(vertices, slice):
+                        count = vertices.stop - vertices.start
+                    else:
+                        count = len(vertices)
+                    component_count = DataType.num_elements(accessor.type)
+                    normalized = bool(accessor.normalized)
+                    key = MSFS_PrimitiveDecoder.constant_key(attr, component_count, count, normalized)
+                    if key not in decoded_keys and key not in constants:
+                        value, component_type = constant
+                        constants[key] = (
+                            np.broadcast_to(np.array(value, dtype=ComponentType.to_numpy_dtype(component_type)), (count, component_count)),
+                            # Set every property the shared accessor could otherwise inherit from whichever source accessor came first
+                            {
+                                "component_type": component_type,
+                                "count": count,
+                                "normalized": normalized,
+                                "min": None,
+                                "max": None,
+                                "sparse": None,
+                            },
+                        )
+                    attributes[attr] = (key, key if key not in decoded_keys else None)
+                    continue
+
+                key = MSFS_PrimitiveDecoder.attribute_key(accessor_idx, attr, extension, vertices)
+                if key is not None and key in decoded_keys:
+                    attributes[attr] = (key, None)
+                    continue
+
+                task_key = key if key is not None else (id(gltf_prim), attr)
+                tasks.setdefault(task_key, (accessor_idx, attr, extension, vertices))
+                attributes[attr] = (key, task_key)
+            primitive_tasks.append(attributes)
+
+        # Gathering the compacted vertices copies every attribute again, which is much faster from contiguous arrays
+        attribute_sources = decode_sources(
+            "vertex buffers",
+            (task[0] for task in tasks.values()),
+            {task[0] for task in tasks.values() if task[3] is not None},
+        )
+
+        def decode_attribute(task):
+            accessor_idx, attr, extension, vertices = task
+            data = attribute_sources[accessor_idx]
+
+            properties = {}
+
+            # Only keep the vertices referenced by the compacted indices
+            if vertices is not None:
+                data = data[vertices]
+                properties["count"] = len(data)
+
+            data, conversion_properties = MSFS_PrimitiveDecoder.convert_attribute(attr, data, extension)
+            properties.update(conversion_properties)
+            return data, properties
+
+        decoded_attributes = dict(zip(tasks, map_tasks("attributes", decode_attribute, list(tasks.values()), lambda result: result[0].nbytes)))
+        decoded_attributes.update(constants)
+        del attribute_sources
+
+        decoded = {}
+        for (_, gltf_prim), (new_indices, component_type, _), attributes in zip(primitives, decoded_indices, primitive_tasks):
+            decoded[gltf_prim] = (
+                new_indices,
+                component_type,
+                {
+                    attr: (key, *(decoded_attributes[task_key] if task_key is not None else (None, None)))
+                    for attr, (key, task_key) in attributes.items()
+                },
+            )
+
+        return decoded
@@ -0,0 +1,198 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+import time
+import threading
+import tracemalloc
+
+
+class MSFS_ProfilerStage:
+    """A single timed stage. Code running inside the stage can add to bytes to report how much data it decoded."""
+
+    def __init__(self, profiler, name, item):
+        self.profiler = profiler
+        self.name = name
+        self.item = item
+        self.bytes = 0
+        self.peak = 0
+
+    def __enter__(self):
+        self.profiler.enter_stage(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start
+        self.profiler.exit_stage(self)
+        self.profiler.record(self.name, self.item, self.start, duration, self.bytes, self.peak)
+        return False
+
+
+class MSFS_NullStage:
+    """Stand-in for MSFS_ProfilerStage while profiling is disabled."""
+
+    bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class MSFS_Profiler:
+    """
+    Optional import instrumentation. Records wall time, decoded bytes and Python/NumPy allocation peaks (through tracemalloc) per stage and item.
+    The results can be printed as a summary table, and written as JSON and as a Chrome trace (chrome://tracing, Perfetto) to compare builds.
+    Allocation peaks are only tracked on the thread that created the profiler, stages recorded from worker threads only report time and bytes.
+    """
+
+    # Whether a profiler started tracemalloc and did not stop it yet
+    tracing = False
+
+    def __init__(self, trace_memory=True):
+        self.events = []
+        self.lock = threading.Lock()
+        self.thread = threading.get_ident()
+        self.stack = []
+        self.origin = time.perf_counter()
+        self.trace_memory = trace_memory and not tracemalloc.is_tracing()
+        if self.trace_memory:
+            tracemalloc.start()
+            MSFS_Profiler.tracing = True
+
+    @staticmethod
+    def get(gltf):
+        """Returns the profiler of an import, or None if profiling is disabled."""
+        return getattr(gltf, "msfs_profiler", None)
+
+    @staticmethod
+    def stage(gltf, name, item=None):
+        """Times a stage of the import of gltf. Does nothing if profiling is disabled for that import."""
+        profiler = MSFS_Profiler.get(gltf)
+        if profiler is None:
+            return MSFS_NullStage()
+        return MSFS_ProfilerStage(profiler, name, item)
+
+    def measure(self, name, item, func, *args):
+        """Calls func(*args) and records how long it took. Safe to use from worker threads."""
+        start = time.perf_counter()
+        result = func(*args)
+        self.record(name, item, start, time.perf_counter() - start, getattr(result, "nbytes", 0))
+        return result
+
+    def enter_stage(self, stage):
+        if not self.trace_memory or threading.get_ident() != self.thread:
+            return
+
+        # tracemalloc only has a single peak, so fold the peak reached so far into the enclosing stage before restarting it
+        if self.stack:
+            self.stack[-1].peak = max(self.stack[-1].peak, tracemalloc.get_traced_memory()[1])
+        self.stack.append(stage)
+        tracemalloc.reset_peak()
+
+    def exit_stage(self, stage):
+        if not self.trace_memory or not self.stack or self.stack[-1] is not stage:
+            return
+
+        self.stack.pop()
+        stage.peak = max(stage.peak, tracemalloc.get_traced_memory()[1])
+
+    def record(self, name, item, start, duration, bytes=0, peak=0):
+        with self.lock:
+            self.events.append(
+                {
+                    "stage": name,
+                    "item": item,
+                    "start": start - self.origin,
+                    "duration": duration,
+                    "bytes": bytes,
+                    "peak": peak,
+                    "thread": threading.get_ident(),
+                }
+            )
+
+    def finish(self):
+        if self.trace_memory:
+            tracemalloc.stop()
+            self.trace_memory = False
+            MSFS_Profiler.tracing = False
+
+    @staticmethod
+    def stop_abandoned():
+        """Stops the tracemalloc session of a profiler which was never finished, such as the one of a failed import which was since garbage collected."""
+        if MSFS_Profiler.tracing:
+            tracemalloc.stop()
+            MSFS_Profiler.tracing = False
+
+    def summary(self):
+        """Aggregates the recorded events per stage, in the order stages first ran."""
+        stages = {}
+        for event in self.events:
+            stage = stages.setdefault(
+                event["stage"],
+                {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "bytes": 0, "peak": 0},
+            )
+            stage["count"] += 1
+            stage["seconds"] += event["duration"]
+            stage["max_seconds"] = max(stage["max_seconds"], event["duration"])
+            stage["bytes"] += event["bytes"]
+            stage["peak"] = max(stage["peak"], event["peak"])
+
+        return stages
+
+    def print_summary(self):
+        stages = self.summary()
+        width = max([len(name) for name in stages] + [5])
+        print(f"{'Stage':<{width}}  {'Count':>7}  {'Total (s)':>10}  {'Max (s)':>9}  {'Decoded (MB)':>12}  {'Peak (MB)':>10}")
+        for name, stage in stages.items():
+            print(
+                f"{name:<{width}}  {stage['count']:>7}  {stage['seconds']:>10.3f}  {stage['max_seconds']:>9.3f}  "
+                f"{stage['bytes'] / (1024 * 1024):>12.1f}  {stage['peak'] / (1024 * 1024):>10.1f}"
+            )
+
+    def write(self, path):
+        """Writes the summary and every event to path as JSON, and a Chrome trace next to it. Returns the paths written."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"stages": self.summary(), "events": self.events}, f, indent=4)
+
+        trace_path = os.path.splitext(path)[0] + ".trace.json"
+        threads = {thread: idx for idx, thread in enumerate(dict.fromkeys(event["thread"] for event in self.events))}
+        with open(trace_path, "w") as f:
+            json.dump(
+                {
+                    "traceEvents": [
+                        {
+                            "name": event["stage"] if event["item"] is None else f"{event['stage']}: {event['item']}",
+                            "cat": event["stage"],
+                            "ph": "X",
+                            "ts": event["start"] * 1e6,
+                            "dur": event["duration"] * 1e6,
+                            "pid": 0,
+                            "tid": threads[event["thread"]],
+                            "args": {"bytes": event["bytes"], "peak": event["peak"]},
+                        }
+                        for event in self.events
+                    ],
+                    "displayTimeUnit": "ms",
+                },
+                f,
+            )
+
+        return path, trace_path
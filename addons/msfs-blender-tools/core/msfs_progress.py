@@ -0,0 +1,150 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import signal
+import threading
+
+
+class MSFS_ImportCancelled(ImportError):
+    """Raised between work items once an import was cancelled. The Khronos importer reports ImportErrors and cancels the import cleanly."""
+
+
+class MSFS_Progress:
+    """
+    Progress of the long running stages of an import, such as texture conversion and primitive decoding, and the cancellation point between their work items.
+    Updates are reported through report() on the thread driving the import, at most every ReportInterval seconds.
+    Once install_interrupt was called on the main thread, an interrupt (Ctrl+C in the console) during a stage cancels the import once the work
+    items in flight are done. A second interrupt, or one outside of a stage, is handled as usual.
+    """
+
+    ReportInterval = 0.1
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.stage = None
+        self.done = 0
+        self.total = 0
+        self.bytes = 0
+        self.last_report = 0.0
+        self.previous_handler = None
+        self.interrupt_installed = False
+
+    @staticmethod
+    def get(gltf):
+        """Returns the progress of an import, or None if it isn't tracked."""
+        return getattr(gltf, "msfs_progress", None)
+
+    @staticmethod
+    def format_bytes(byte_count):
+        if byte_count >= 1024 * 1024 * 1024:
+            return f"{byte_count / (1024 * 1024 * 1024):.1f} GB"
+        return f"{byte_count / (1024 * 1024):.1f} MB"
+
+    def status(self):
+        """Returns a status line for the current stage, such as "textures 43/188, 1.2 GB decoded"."""
+        status = f"{self.stage} {self.done}/{self.total}"
+        if self.bytes:
+            status += f", {MSFS_Progress.format_bytes(self.bytes)} decoded"
+        return status
+
+    def report(self):
+        """Called whenever the progress changed. Does nothing by default, subclasses show the progress to the user."""
+
+    def cancel(self):
+        """Cancels the import. Safe to call from any thread or signal handler."""
+        self.cancelled.set()
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise MSFS_ImportCancelled(f"Import cancelled during {self.stage or 'import'}")
+
+    def interrupt(self, signum, frame):
+        if self.stage is None or self.cancelled.is_set():
+            # Nothing checks for cancellation outside of a stage, and interrupted again while waiting for the work in flight
+            # should stop right away
+            if callable(self.previous_handler):
+                self.previous_handler(signum, frame)
+            else:
+                signal.default_int_handler(signum, frame)
+            return
+        self.cancel()
+
+    def install_interrupt(self):
+        """
+        Cancels the import on interrupts until restore_interrupt is called. Does nothing outside of the main thread, which is the
+        only one signal handlers can be installed from.
+        """
+        if self.interrupt_installed or threading.current_thread() is not threading.main_thread():
+            return
+
+        self.previous_handler = signal.getsignal(signal.SIGINT)
+        signal.signal(signal.SIGINT, self.interrupt)
+        self.interrupt_installed = True
+
+    def restore_interrupt(self):
+        if not self.interrupt_installed:
+            return
+
+        # None means the previous handler wasn't installed from Python, such as Blender's own handler in background mode.
+        # It can't be reinstalled, so fall back to Python's default, which raises KeyboardInterrupt
+        previous_handler = self.previous_handler
+        if previous_handler is None:
+            previous_handler = signal.default_int_handler
+        signal.signal(signal.SIGINT, previous_handler)
+        self.previous_handler = None
+        self.interrupt_installed = False
+
+    def begin(self, stage, total):
+        self.check()
+        self.stage = stage
+        self.done = 0
+        self.total = total
+        self.bytes = 0
+        self.last_report = time.perf_counter()
+        self.report()
+
+    def advance(self, count=1, bytes=0):
+        self.done += count
+        self.bytes += bytes
+
+        now = time.perf_counter()
+        if now - self.last_report >= MSFS_Progress.ReportInterval or self.done >= self.total:
+            self.last_report = now
+            self.report()
+
+        self.check()
+
+    def end(self):
+        self.stage = None
+        self.report()
+
+    def track(self, stage, results, total, measure=None):
+        """
+        Yields from results, advancing the stage by one item per result, with measure(result) bytes if given.
+        Cancellation is checked between results. Once cancelled, the remaining results are closed, which cancels
+        work an executor has not started yet (see Executor.map), and MSFS_ImportCancelled is raised.
+        """
+        self.begin(stage, total)
+        try:
+            for result in results:
+                self.advance(1, measure(result) if measure is not None else 0)
+                yield result
+        finally:
+            close = getattr(results, "close", None)
+            if close is not None:
+                close()
+            self.end()
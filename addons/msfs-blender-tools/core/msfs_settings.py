@@ -0,0 +1,59 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+class MSFS_Settings:
+    """
+    Plain copy of the add-on preferences used by the decoding core. Unlike the Blender preferences it can be created without
+    Blender, and passed to code running outside of it.
+    """
+
+    def __init__(
+        self,
+        fs_base_dir="",
+        accessor_cache_size=1024,
+        decode_workers=0,
+        texture_workers=0,
+        texture_cache_enabled=True,
+        texture_cache_dir="",
+        texture_cache_size=8192,
+        texture_cache_hash=False,
+        decoded_texture_budget=4096,
+    ):
+        self.fs_base_dir = fs_base_dir
+        self.accessor_cache_size = accessor_cache_size # MB
+        self.decode_workers = decode_workers # 0 uses one worker per CPU core
+        self.texture_workers = texture_workers # 0 uses one worker per CPU core
+        self.texture_cache_enabled = texture_cache_enabled
+        self.texture_cache_dir = texture_cache_dir
+        self.texture_cache_size = texture_cache_size # MB
+        self.texture_cache_hash = texture_cache_hash
+        self.decoded_texture_budget = decoded_texture_budget # MB, 0 is unlimited
+
+    @staticmethod
+    def from_preferences(preferences):
+        """Copies the settings from the add-on preferences (FBW_AddonPreferences)."""
+        return MSFS_Settings(
+            fs_base_dir=preferences.fs_base_dir,
+            accessor_cache_size=preferences.accessor_cache_size,
+            decode_workers=preferences.decode_workers,
+            texture_workers=preferences.texture_workers,
+            texture_cache_enabled=preferences.texture_cache_enabled,
+            texture_cache_dir=preferences.texture_cache_dir,
+            texture_cache_size=preferences.texture_cache_size,
+            texture_cache_hash=preferences.texture_cache_hash,
+            decoded_texture_budget=preferences.decoded_texture_budget,
+        )
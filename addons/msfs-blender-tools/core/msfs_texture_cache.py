@@ -0,0 +1,152 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import zlib
+import uuid
+import hashlib
+import zipfile
+import tempfile
+import numpy as np
+
+from .msfs_texture_resolver import texture_resolver
+
+
+class MSFS_TextureCache:
+    """
+    On-disk cache of decoded DDS textures, shared between imports.
+    Entries are keyed by the source file and the conversion applied to it, and evicted least recently used first once the cache grows past its size cap.
+    Entries are compressed .npz files, a decoded 4K texture would otherwise take 64 MB of the cap.
+    """
+
+    Version = 3 # Bump whenever the cached pixel format or conversion changes
+
+    # Fastest deflate level, which already gets most of the size reduction of the default level at about half its cost
+    CompressLevel = 1
+    EntrySuffix = ".npz"
+    StaleSuffixes = (".npy",) # Uncompressed entries of earlier versions, only kept around to be trimmed
+
+    def __init__(self, directory, max_bytes, hash_contents=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hash_contents = hash_contents
+
+    @staticmethod
+    def default_directory():
+        return os.path.join(tempfile.gettempdir(), "msfs-blender-tools", "textures")
+
+    @staticmethod
+    def from_settings(settings):
+        """Returns the texture cache configured in the settings (see MSFS_Settings), or None if it is disabled."""
+        if not settings.texture_cache_enabled:
+            return None
+
+        return MSFS_TextureCache(
+            settings.texture_cache_dir or MSFS_TextureCache.default_directory(),
+            settings.texture_cache_size * 1024 * 1024,
+            settings.texture_cache_hash,
+        )
+
+    def key(self, texture_path, flags=(), level=0):
+        """
+        Builds the cache key of a texture. Flags describe conversions applied to the pixels, such as DXT5N normal handling.
+        Level is the number of times reduced resolution textures were halved (see MSFS_TextureDecoder.decode_image).
+        """
+        if self.hash_contents:
+            # Identical files share an entry, wherever they are located. Files hashed before, such as by find_duplicates, aren't read again
+            source = texture_resolver.content_hash(texture_path)
+        else:
+            stat = os.stat(texture_path)
+            source = f"{os.path.normcase(os.path.abspath(texture_path))}|{stat.st_size}|{stat.st_mtime_ns}"
+
+        key = f"{MSFS_TextureCache.Version}|{source}|{','.join(sorted(flags))}"
+        if level:
+            key += f"|{level}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + MSFS_TextureCache.EntrySuffix)
+
+    def get(self, key):
+        """Returns the cached pixels for a key, or None on a cache miss. Truncated or corrupt entries are misses too."""
+        path = self.entry_path(key)
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                pixels = entry["pixels"]
+        except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile, zlib.error):
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return pixels
+
+    def put(self, key, pixels):
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Write to a temporary file first so concurrent imports never read a partially written entry
+        temp_path = os.path.join(self.directory, f"{key}.{uuid.uuid4().hex}.tmp")
+        try:
+            # Same layout as np.savez_compressed, with a faster compression level
+            with zipfile.ZipFile(temp_path, "w", zipfile.ZIP_DEFLATED, compresslevel=MSFS_TextureCache.CompressLevel) as archive:
+                with archive.open("pixels.npy", "w", force_zip64=True) as f:
+                    np.lib.format.write_array(f, np.ascontiguousarray(pixels), allow_pickle=False)
+            os.replace(temp_path, self.entry_path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+
+        with os.scandir(self.directory) as it:
+            return [
+                entry
+                for entry in it
+                if entry.is_file() and entry.name.endswith((MSFS_TextureCache.EntrySuffix,) + MSFS_TextureCache.StaleSuffixes)
+            ]
+
+    def trim(self):
+        """Evicts the least recently used entries until the cache fits its size cap."""
+        entries = []
+        for entry in self.entries():
+            try:
+                entries.append((entry.stat(), entry.path))
+            except OSError:
+                pass # Evicted by a concurrent import in the meantime
+
+        total_bytes = sum(stat.st_size for stat, _ in entries)
+
+        for stat, path in sorted(entries, key=lambda entry: entry[0].st_mtime_ns):
+            if total_bytes <= self.max_bytes:
+                break
+
+            try:
+                os.remove(path)
+                total_bytes -= stat.st_size
+            except OSError:
+                pass
+
+    def clear(self):
+        for entry in self.entries():
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
@@ -0,0 +1,315 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import os
+import json
+import numpy as np
+
+from .msfs_dds import MSFS_DDS
+from .msfs_executor import MSFS_Executor
+from .msfs_texture_resolver import texture_resolver
+
+
+def print_console(level, message):
+    # Same format as the Khronos importer's gltf2_io_debug.print_console, which can't be imported without Blender
+    print(f"{level}: {message}")
+
+
+class MSFS_TextureDecoder:
+    """Resolves and decodes MSFT_texture_dds textures to RGBA pixel arrays, independently of Blender."""
+
+    SerializedName = "MSFT_texture_dds"
+
+    # A 1x1 PNG handed to the Khronos importer in place of converted textures, so it creates the Blender image for us cheaply.
+    # The real pixels are loaded into that image in load_pixels
+    PlaceholderURI = "data:application/octet-stream;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNgYGD4DwABBAEAgLvRWwAAAABJRU5ErkJggg=="
+
+    # Number of pixels processed at once when reconstructing normal maps, bounding the temporary memory used per texture
+    NormalMapTilePixels = 1024 * 1024
+
+    _normal_map_blue_table = None
+
+    @staticmethod
+    def reconstruct_normals(pixels, width, height):
+        """
+        Flip the green channel and reconstruct the blue channel of a flat RGBA float32 pixel buffer, in place.
+        The work is done over fixed-size row tiles with a single reusable scratch row block, so no full-size temporaries are allocated.
+        """
+        pixels = pixels.reshape((height, width, 4))
+        tile_rows = max(1, MSFS_TextureDecoder.NormalMapTilePixels // max(width, 1))
+        scratch = np.empty((tile_rows, width), dtype=np.float32)
+
+        for first_row in range(0, height, tile_rows):
+            tile = pixels[first_row : first_row + tile_rows]
+            red = tile[..., 0]
+            green = tile[..., 1]
+            blue = tile[..., 2]
+            radicand = scratch[: len(tile)]
+
+            np.subtract(1.0, green, out=green)
+
+            # z = sqrt(1 - (x - 0.5)^2 - (y - 0.5)^2), clamped so rounding never gives a negative radicand (NaN)
+            np.subtract(red, 0.5, out=radicand)
+            np.square(radicand, out=radicand)
+            np.subtract(1.0, radicand, out=radicand)
+            np.subtract(green, 0.5, out=blue)
+            np.square(blue, out=blue)
+            np.subtract(radicand, blue, out=blue)
+            np.maximum(blue, 0.0, out=blue)
+            np.sqrt(blue, out=blue)
+
+    @staticmethod
+    def normal_map_blue_table():
+        """
+        Returns a 256 x 256 table holding the reconstructed 8-bit blue value for every 8-bit red and (unflipped) green value.
+        The table is built with the same float math Blender would apply to the loaded image, quantized the way Blender stores byte pixels.
+        """
+        if MSFS_TextureDecoder._normal_map_blue_table is None:
+            red, green = np.meshgrid(
+                np.arange(256, dtype=np.float32),
+                np.arange(256, dtype=np.float32),
+                indexing="ij",
+            )
+            pixels = np.zeros((256, 256, 4), dtype=np.float32)
+            pixels[..., 0] = red * np.float32(1 / 255)
+            pixels[..., 1] = green * np.float32(1 / 255)
+            MSFS_TextureDecoder.reconstruct_normals(pixels, 256, 256)
+
+            blue = pixels[..., 2] * np.float32(255) + np.float32(0.5)
+            MSFS_TextureDecoder._normal_map_blue_table = np.clip(np.floor(blue), 0, 255).astype(np.uint8)
+
+        return MSFS_TextureDecoder._normal_map_blue_table
+
+    @staticmethod
+    def convert_normal_pixels(pixels):
+        """
+        Asobo normal maps have no z (blue) channel, so we have to calculate one, as well as flip the y (green) channel.
+        Works in place on a height x width x 4 RGBA uint8 array, over fixed-size row tiles.
+        """
+        height, width = pixels.shape[:2]
+        blue_table = MSFS_TextureDecoder.normal_map_blue_table()
+        tile_rows = max(1, MSFS_TextureDecoder.NormalMapTilePixels // max(width, 1))
+
+        for first_row in range(0, height, tile_rows):
+            tile = pixels[first_row : first_row + tile_rows]
+            # Reconstruct blue from the unflipped green first, the table accounts for the flip
+            tile[..., 2] = blue_table[tile[..., 0], tile[..., 1]]
+            np.subtract(255, tile[..., 1], out=tile[..., 1])
+
+    @staticmethod
+    def decode_image(texture_path, flags=(), texture_cache=None, max_size=0):
+        """
+        Open a DDS image with PIL and decode it to a height x width x 4 RGBA array. Safe to run on a worker thread.
+        If a texture cache is given, previously decoded pixels are read from it instead of decoding the DDS again.
+        If max_size is set, the image is halved until it is at most max_size pixels wide and tall. The matching mip level is
+        read straight from the DDS file (see MSFS_DDS). Files without that level are reduced from their smallest level instead.
+        """
+        level = 0
+        dds = MSFS_DDS.open(texture_path) if max_size else None
+        if dds is not None:
+            level = dds.level_for(max_size)
+
+        if texture_cache is not None:
+            cache_key = texture_cache.key(texture_path, flags, level)
+            pixels = texture_cache.get(cache_key)
+            if pixels is not None:
+                return pixels
+
+        from PIL import Image
+
+        source = texture_path
+        reduction = level
+        if level:
+            mip_level = min(level, dds.mip_count - 1)
+            level_data = dds.read_level(mip_level) if mip_level else None
+            if level_data is not None:
+                source = io.BytesIO(level_data)
+                reduction = level - mip_level
+
+        with Image.open(source) as image:
+            image = image.convert("RGBA")
+            if reduction:
+                image = image.reduce(1 << reduction)
+            pixels = np.asarray(image)
+
+        if "FL_BITMAP_TANGENT_DXT5N" in flags:
+            # During the build process, many changes are applied to the normal maps. We want to undo that
+            if not pixels.flags.writeable:
+                pixels = pixels.copy()
+            MSFS_TextureDecoder.convert_normal_pixels(pixels)
+
+        if texture_cache is not None:
+            texture_cache.put(cache_key, pixels)
+
+        return pixels
+
+    @staticmethod
+    def texture_flags(texture_path):
+        """Returns the conversion flags of a DDS file, read from the JSON file next to it."""
+        flags = []
+        image_json = texture_resolver.find_in_folder(
+            os.path.dirname(texture_path), os.path.basename(texture_path) + ".json"
+        )
+        if image_json is not None:
+            with open(image_json, "r") as f:
+                data = json.loads(f.read())
+
+            if "FL_BITMAP_TANGENT_DXT5N" in data.get("Flags", []):
+                flags.append("FL_BITMAP_TANGENT_DXT5N")
+
+        return flags
+
+    @staticmethod
+    def find_duplicates(texture_paths, executor=None):
+        """
+        Finds files with identical contents, such as liveries and decals copied between packages or fallback folders.
+        Only files sharing their size with another file are hashed, on executor if one is given. Hashes are kept by the
+        texture resolver, so files unchanged since an earlier import aren't read again.
+        Returns {texture path: first texture path with identical contents} for every duplicate, in the order of texture_paths.
+        """
+        sizes = {}
+        for texture_path in texture_paths:
+            sizes.setdefault(os.path.getsize(texture_path), []).append(texture_path)
+
+        candidates = [texture_path for paths in sizes.values() if len(paths) > 1 for texture_path in paths]
+        hashes = (executor.map if executor is not None else map)(texture_resolver.content_hash, candidates)
+
+        originals = {} # Content hash -> first texture path with those contents
+        duplicates = {}
+        for texture_path, content_hash in zip(candidates, hashes):
+            original = originals.setdefault(content_hash, texture_path)
+            if original != texture_path:
+                duplicates[texture_path] = original
+
+        return duplicates
+
+    @staticmethod
+    def find_conversions(gltf, settings, deduplicate_contents=True):
+        """
+        Resolves the DDS file and conversion flags of every image referenced through MSFT_texture_dds, and points the textures
+        at those images directly. Returns {source image: (texture path, flags)}, in the order the textures reference them.
+        Each image is converted once, however many textures reference it. Images resolving to the same file, or to files with
+        identical contents, are converted once too: their textures all point at the first of those images.
+        Comparing contents reads the files, so it can be turned off with deduplicate_contents, such as for lazy imports.
+        """
+        texture_resolver.begin_import()
+
+        # Assume we are in a proper structured project
+        textures_folder = os.path.join(
+            os.path.dirname(os.path.dirname(gltf.import_settings["filepath"])),
+            "TEXTURE",
+        )
+
+        # Group the textures by the image they reference
+        image_textures = {} # Image index -> textures referencing it, in the order the textures reference them
+        for gltf_texture in gltf.data.textures:
+            if (
+                gltf_texture.extensions is not None
+                and MSFS_TextureDecoder.SerializedName in gltf_texture.extensions
+                and gltf_texture.extensions[MSFS_TextureDecoder.SerializedName].get("source") is not None
+            ):
+                image_textures.setdefault(
+                    gltf_texture.extensions[MSFS_TextureDecoder.SerializedName]["source"], []
+                ).append(gltf_texture)
+
+        resolved = {} # Image index -> (texture path, flags), or None if the image was already converted
+        for image_idx in image_textures:
+            source = gltf.data.images[image_idx]
+            if source.uri == MSFS_TextureDecoder.PlaceholderURI:
+                print_console("INFO", f"Texture already converted, skipping")
+                resolved[image_idx] = None
+                continue
+
+            texture_path = texture_resolver.resolve(
+                textures_folder, source.uri, settings.fs_base_dir
+            )
+            if texture_path is None:
+                print_console("WARNING", f"Texture {source.uri} failed to convert")
+                continue
+
+            resolved[image_idx] = (texture_path, MSFS_TextureDecoder.texture_flags(texture_path))
+
+        # The same file can be reached through different paths and fallback folders
+        real_paths = {
+            image_idx: os.path.normcase(os.path.realpath(conversion[0]))
+            for image_idx, conversion in resolved.items()
+            if conversion is not None
+        }
+        duplicates = {}
+        if deduplicate_contents:
+            duplicates = MSFS_TextureDecoder.find_duplicates(
+                list(dict.fromkeys(real_paths.values())),
+                MSFS_Executor.get("texture", settings.texture_workers or os.cpu_count()),
+            )
+
+        conversions = {} # Source image -> (texture path, flags), in the order the textures reference them
+        converted_images = {} # (file, flags) -> index of the image converting it
+        for image_idx, conversion in resolved.items():
+            target_idx = image_idx
+            if conversion is not None:
+                real_path = real_paths[image_idx]
+                target_idx = converted_images.setdefault(
+                    (duplicates.get(real_path, real_path), tuple(conversion[1])), image_idx
+                )
+                if target_idx == image_idx:
+                    conversions[gltf.data.images[image_idx]] = conversion
+                else:
+                    print_console(
+                        "INFO",
+                        f"Image {image_idx} ({gltf.data.images[image_idx].uri}) is identical to image {target_idx} ({gltf.data.images[target_idx].uri}), converting it once",
+                    )
+
+            for gltf_texture in image_textures[image_idx]:
+                gltf_texture.extensions = None
+                gltf_texture.source = target_idx
+
+        return conversions
+
+    @staticmethod
+    def image_size(texture_path):
+        """Returns the full resolution (width, height) of a texture, read from its header."""
+        dds = MSFS_DDS.open(texture_path)
+        if dds is not None:
+            return dds.width, dds.height
+
+        from PIL import Image
+
+        with Image.open(texture_path) as image:
+            return image.size
+
+    @staticmethod
+    def decode_conversions(conversions, settings, texture_cache=None, profiler=None, progress=None, max_size=0):
+        """
+        Decodes the textures found by find_conversions concurrently on the worker pool, at most max_size pixels wide and tall if set.
+        Yields (source image, pixels) in the order of conversions, whatever order the workers finish in.
+        Each texture is reported to progress (see MSFS_Progress) if one is given, which may cancel the remaining conversions.
+        """
+        # Decoding the DDS happens in native code which releases the GIL, so threads scale well here
+        executor = MSFS_Executor.get("texture", settings.texture_workers or os.cpu_count())
+
+        def decode_conversion(source, conversion):
+            if profiler is None:
+                return MSFS_TextureDecoder.decode_image(*conversion, texture_cache, max_size)
+            return profiler.measure(
+                "decode_image", source.uri, MSFS_TextureDecoder.decode_image, *conversion, texture_cache, max_size
+            )
+
+        results = executor.map(decode_conversion, conversions, conversions.values())
+        if progress is not None:
+            results = progress.track("textures", results, len(conversions), lambda pixels: pixels.nbytes)
+
+        yield from zip(conversions, results)
@@ -0,0 +1,157 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import hashlib
+import threading
+import configparser
+
+
+class MSFS_TextureResolver:
+    """
+    Resolves texture file names to paths, looking in the TEXTURE folder next to the model and then in the fallback folders listed in its texture.cfg.
+    Each folder is listed once with os.scandir and each texture.cfg is parsed once. The results are kept across textures and imports,
+    and refreshed when the modification time of a folder or texture.cfg changes. Modification times are checked once per import (see begin_import).
+    Content hashes of texture files are kept too, so unchanged files are only read once per session (see content_hash).
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self.folder_indices = {} # Folder -> (generation, mtime, {normalized file name: path}) or None if the folder doesn't exist
+        self.fallback_folders = {} # texture.cfg path -> (generation, mtime, [fallback folder]) or None if the file doesn't exist
+        self.content_hashes = {} # Normalized file path -> (size, mtime, content hash)
+        self.content_hashes_lock = threading.Lock()
+
+    def begin_import(self):
+        """Starts a new import. Folders and texture.cfg files are checked for changes again the next time they are used."""
+        self.generation += 1
+
+    @staticmethod
+    def stat_mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def folder_index(self, folder):
+        """Returns a dictionary of the files in a folder, keyed by their normalized name."""
+        cached = self.folder_indices.get(folder)
+        if cached is not None and cached[0] == self.generation:
+            return cached[2]
+
+        mtime = MSFS_TextureResolver.stat_mtime(folder)
+        if cached is not None and cached[1] == mtime:
+            index = cached[2]
+        elif mtime is None:
+            index = None
+        else:
+            index = {}
+            try:
+                with os.scandir(folder) as it:
+                    for entry in it:
+                        index[os.path.normcase(entry.name)] = entry.path
+            except OSError:
+                index = None
+
+        self.folder_indices[folder] = (self.generation, mtime, index)
+        return index
+
+    def texture_config_fallbacks(self, textures_folder, fs_base_dir):
+        """Returns the fallback folders listed in the texture.cfg of a TEXTURE folder, or None if there is no usable texture.cfg."""
+        texture_config_path = os.path.join(textures_folder, "texture.cfg")
+
+        cached = self.fallback_folders.get(texture_config_path)
+        if cached is None or cached[0] != self.generation:
+            mtime = MSFS_TextureResolver.stat_mtime(texture_config_path)
+            if cached is not None and cached[1] == mtime:
+                fallbacks = cached[2]
+            elif mtime is None:
+                fallbacks = None
+            else:
+                parser = configparser.ConfigParser()
+                parser.read(texture_config_path)
+
+                if "fltsim" in parser:
+                    fltsim = parser["fltsim"]
+                    fallbacks = [fltsim[fallback].split(".")[-1] for fallback in list(fltsim)]
+                else:
+                    fallbacks = None
+
+            cached = (self.generation, mtime, fallbacks)
+            self.fallback_folders[texture_config_path] = cached
+
+        if cached[2] is None:
+            return None
+
+        return [os.path.join(fs_base_dir or "", fallback) for fallback in cached[2]]
+
+    def find_in_folder(self, folder, file_name):
+        if os.path.dirname(file_name):
+            # Only plain file names are indexed
+            path = os.path.join(folder, file_name)
+            return path if os.path.exists(path) else None
+
+        index = self.folder_index(folder)
+        if index is None:
+            return None
+
+        return index.get(os.path.normcase(file_name))
+
+    @staticmethod
+    def hash_file(path):
+        """Returns a hash of the contents of a file, identical for identical files wherever they are located."""
+        content_hash = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                content_hash.update(chunk)
+        return content_hash.hexdigest()
+
+    def content_hash(self, path):
+        """
+        Returns the content hash of a file (see hash_file). The file is only read again if its size or modification time changed.
+        Safe to call from worker threads.
+        """
+        stat = os.stat(path)
+        key = os.path.normcase(os.path.abspath(path))
+
+        with self.content_hashes_lock:
+            cached = self.content_hashes.get(key)
+        if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            return cached[2]
+
+        content_hash = MSFS_TextureResolver.hash_file(path)
+        with self.content_hashes_lock:
+            self.content_hashes[key] = (stat.st_size, stat.st_mtime_ns, content_hash)
+        return content_hash
+
+    def resolve(self, textures_folder, file_name, fs_base_dir):
+        """Returns the path of a texture, or None if it can't be found in the TEXTURE folder or its fallbacks."""
+        texture_path = self.find_in_folder(textures_folder, file_name)
+        if texture_path is not None:
+            return texture_path
+
+        # Use fallbacks in the texture.cfg
+        fallbacks = self.texture_config_fallbacks(textures_folder, fs_base_dir)
+        for fallback_path in fallbacks or []:
+            texture_path = self.find_in_folder(fallback_path, file_name)
+            if texture_path is not None:
+                return texture_path
+
+        return None
+
+
+# Shared between imports, so folders stay indexed from one import to the next
+texture_resolver = MSFS_TextureResolver()
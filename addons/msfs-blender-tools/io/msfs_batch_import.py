@@ -0,0 +1,193 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import bpy
+import json
+import time
+
+from io_scene_gltf2.io.com import gltf2_io_debug
+
+from .msfs_import import Import
+from .msfs_progress import MSFS_ImportProgress
+
+
+def find_gltf_files(paths):
+    """Expands a list of glTF files and package directories into a sorted list of glTF files."""
+    gltf_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                gltf_files.extend(
+                    os.path.join(root, file)
+                    for file in files
+                    if file.lower().endswith((".gltf", ".glb"))
+                )
+        else:
+            gltf_files.append(path)
+
+    return sorted(gltf_files)
+
+
+def import_file(filepath):
+    """
+    Imports a single glTF file. Returns its result entry, and whether the import was cancelled (see MSFS_ImportProgress).
+    Whatever a failed import still holds is released right away, rather than once the next import starts.
+    """
+    gltf2_io_debug.print_console("INFO", f"Batch import: importing {filepath}")
+
+    start = time.perf_counter()
+    cancellations = MSFS_ImportProgress.cancellations
+    try:
+        status = bpy.ops.import_scene.gltf(filepath=filepath)
+        error = None
+    except Exception as e: # One broken file shouldn't stop the whole batch
+        status = {"CANCELLED"}
+        error = str(e)
+    Import.release_abandoned()
+
+    result = {
+        "file": filepath,
+        "status": "FINISHED" if "FINISHED" in status else "CANCELLED",
+        "seconds": time.perf_counter() - start,
+        "error": error,
+    }
+    return result, MSFS_ImportProgress.cancellations != cancellations
+
+
+def finish_batch(results, report_path=None):
+    print_report(results)
+
+    if report_path:
+        with open(report_path, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+def batch_import(paths, report_path=None):
+    """
+    Imports many glTF files one after the other in the current Blender session.
+    The texture cache, texture resolver and worker pools are module level, so they stay warm from one file to the next.
+    Cancelling one of the imports (see MSFS_ImportProgress) stops the batch.
+    Returns the per-file results, and optionally writes them to report_path as JSON.
+    """
+    results = []
+    for filepath in find_gltf_files(paths):
+        result, cancelled = import_file(filepath)
+        results.append(result)
+
+        if cancelled:
+            gltf2_io_debug.print_console("WARNING", "Batch import: cancelled, skipping the remaining files")
+            break
+
+    finish_batch(results, report_path)
+    return results
+
+
+def print_report(results):
+    width = max([len(result["file"]) for result in results] + [4])
+    print(f"{'File':<{width}}  {'Status':<9}  {'Time (s)':>9}")
+    for result in results:
+        print(f"{result['file']:<{width}}  {result['status']:<9}  {result['seconds']:>9.2f}")
+    print(f"{'Total':<{width}}  {'':<9}  {sum(result['seconds'] for result in results):>9.2f}")
+
+
+class FBW_OT_batch_import(bpy.types.Operator):
+    bl_idname = "fbw.batch_import"
+    bl_label = "Batch Import MSFS glTF"
+    bl_description = "Import many MSFS glTF files, or every glTF file in a package directory, in one go, reporting the time taken by each file"
+    bl_options = {"REGISTER", "UNDO"}
+
+    directory: bpy.props.StringProperty(subtype="DIR_PATH")
+    files: bpy.props.CollectionProperty(type=bpy.types.OperatorFileListElement)
+    filter_glob: bpy.props.StringProperty(default="*.gltf;*.glb", options={"HIDDEN"})
+
+    report_path: bpy.props.StringProperty(
+        name="Report",
+        description="Optional path of a JSON file the per-file timings are written to",
+        default="",
+        subtype="FILE_PATH",
+    )
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {"RUNNING_MODAL"}
+
+    def execute(self, context):
+        # Import the selected files, or the whole directory if no file is selected
+        paths = [os.path.join(self.directory, file.name) for file in self.files if file.name]
+        if not paths:
+            paths = [self.directory]
+
+        self.gltf_files = find_gltf_files(paths)
+        self.results = []
+        if not self.gltf_files:
+            self.report({"WARNING"}, "No glTF files found")
+            return {"CANCELLED"}
+
+        if bpy.app.background:
+            # No event loop to drive the modal import
+            self.results = batch_import(paths, self.report_path or None)
+            return self.report_results()
+
+        # Import one file per timer event, so Blender handles events in between and Esc cancels the remaining files
+        self.timer = context.window_manager.event_timer_add(0.01, window=context.window)
+        context.window_manager.modal_handler_add(self)
+        return {"RUNNING_MODAL"}
+
+    def modal(self, context, event):
+        if event.type == "ESC":
+            gltf2_io_debug.print_console("WARNING", "Batch import: cancelled, skipping the remaining files")
+            return self.finish(context)
+        if event.type != "TIMER" or event.timer is not self.timer:
+            return {"PASS_THROUGH"}
+
+        result, cancelled = import_file(self.gltf_files[len(self.results)])
+        self.results.append(result)
+        if cancelled:
+            gltf2_io_debug.print_console("WARNING", "Batch import: cancelled, skipping the remaining files")
+        if cancelled or len(self.results) == len(self.gltf_files):
+            return self.finish(context)
+
+        context.workspace.status_text_set(
+            f"MSFS batch import: {len(self.results)}/{len(self.gltf_files)} files (Esc to cancel the remaining files)"
+        )
+        return {"RUNNING_MODAL"}
+
+    def finish(self, context):
+        context.window_manager.event_timer_remove(self.timer)
+        context.workspace.status_text_set(None)
+        finish_batch(self.results, self.report_path or None)
+        return self.report_results()
+
+    def report_results(self):
+        failed = [result for result in self.results if result["status"] != "FINISHED"]
+        self.report(
+            {"WARNING"} if failed or len(self.results) < len(self.gltf_files) else {"INFO"},
+            f"Imported {len(self.results) - len(failed)}/{len(self.gltf_files)} files in {sum(result['seconds'] for result in self.results):.1f} s",
+        )
+        return {"FINISHED"}
+
+
+def menu_func_import(self, context):
+    self.layout.operator(FBW_OT_batch_import.bl_idname, text="MSFS glTF Batch (.gltf)")
+
+
+def register():
+    bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
+
+
+def unregister():
+    bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
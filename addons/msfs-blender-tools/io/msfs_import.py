@@ -14,9 +14,22 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import bpy
+import time
+import weakref
+import tempfile
 
+from io_scene_gltf2.io.com import gltf2_io_debug
+
+from ..core.msfs_binary import MSFS_Binary
+from ..core.msfs_executor import MSFS_Executor
+from ..core.msfs_primitive_decoder import MSFS_PrimitiveDecoder
+from ..core.msfs_profiler import MSFS_Profiler
+from ..core.msfs_progress import MSFS_Progress
+from ..core.msfs_settings import MSFS_Settings
 from .msfs_primitive import MSFS_Primitive
+from .msfs_progress import MSFS_ImportProgress
 from .msfs_texture import MSFS_Texture
 
 def on_built_asset(func):
@@ -30,31 +43,160 @@ def on_built_asset(func):
     return inner
 
 class Import:
+    # The import between the scene before and after animation hooks. An import failing in between never reaches the after hook,
+    # so the next import releases what it still holds
+    active_import = None # weakref to the glTF
+
     def __init__(self):
         pass
 
+    @staticmethod
+    def release(gltf):
+        """
+        Releases what an import holds on to. Runs once the import is done, and when it failed or was cancelled, where the glTF may
+        be kept alive by the traceback for a while.
+        """
+        progress = MSFS_Progress.get(gltf)
+        if progress is not None:
+            if progress.stage is not None:
+                progress.end() # Ends the progress indicator and status text
+            progress.restore_interrupt()
+            del gltf.msfs_progress
+
+        # Decoded data of meshes and images the importer never created
+        for name in ("decoded_primitives", "decoded_images", "pending_images", "msfs_accessor_cache"):
+            if hasattr(gltf, name):
+                delattr(gltf, name)
+
+        # The importer's own accessor cache holds views of the mapped .bin files too
+        decode_accessor_cache = getattr(gltf, "decode_accessor_cache", None)
+        if decode_accessor_cache is not None:
+            decode_accessor_cache.clear()
+        lingering = MSFS_Binary.unmap_buffers(gltf)
+        if lingering:
+            gltf2_io_debug.print_console("WARNING", f"{lingering} .bin files are still in use, they are closed once released")
+
+        profiler = MSFS_Profiler.get(gltf)
+        if profiler is not None:
+            profiler.finish() # Stops tracemalloc, which would otherwise trace every allocation for the rest of the session
+            del gltf.msfs_profiler
+
+        if Import.active_import is not None and Import.active_import() is gltf:
+            Import.active_import = None
+
+    @staticmethod
+    def release_abandoned():
+        """Releases an earlier import which failed after the scene before hook, for example while the importer created its meshes."""
+        gltf = Import.active_import() if Import.active_import is not None else None
+        Import.active_import = None
+        if gltf is not None:
+            Import.release(gltf)
+        MSFS_Profiler.stop_abandoned()
+
     @on_built_asset
     def gather_import_scene_before_hook(self, gltf_scene, blender_scene, gltf):
+        Import.release_abandoned()
+        Import.active_import = weakref.ref(gltf)
+
+        try:
+            self.prepare_import(gltf)
+        except BaseException:
+            Import.release(gltf)
+            raise
+
+    def prepare_import(self, gltf):
         # Overwrite certain import settings
         gltf.import_settings['merge_vertices'] = True # Having this set to False gives us some shading issues
         gltf.import_settings['guess_original_bind_pose'] = False # Having this set to True causes lots of skinning issues
         gltf.import_settings['bone_heuristic'] = 'BLENDER' # Setting this to BLENDER yields the best results for reimporting back into the sim. From limited testing, this resolves wingflex and winglets being flipped
-        MSFS_Texture.convert_textures(gltf)
+
+        if self.properties.profile:
+            gltf.msfs_profiler = MSFS_Profiler(trace_memory=self.properties.profile_memory)
+
+        # Report progress of the long running stages below, which can be cancelled between work items
+        gltf.msfs_progress = MSFS_ImportProgress()
+        gltf.msfs_progress.install_interrupt()
+
+        # Map the .bin files before the importer reads them into memory whole
+        with MSFS_Profiler.stage(gltf, "map_buffers") as stage:
+            stage.bytes = MSFS_Binary.map_buffers(gltf)
+
+        with MSFS_Profiler.stage(gltf, "convert_textures"):
+            MSFS_Texture.convert_textures(gltf, self.properties.lazy_textures, self.properties.texture_max_size)
+
+        settings = MSFS_Settings.from_preferences(
+            bpy.context.preferences.addons[os.path.splitext(__package__)[0]].preferences
+        )
+        MSFS_Binary.create_accessor_cache(
+            gltf,
+            settings.accessor_cache_size * 1024 * 1024,
+            MSFS_PrimitiveDecoder.find_shared_accessors(gltf),
+        )
+
+        # Decode all primitives concurrently now, the mesh pass then only has to install them
+        with MSFS_Profiler.stage(gltf, "decode_primitives"):
+            MSFS_Primitive.decode_primitives(
+                gltf,
+                self.properties.vertex_compaction,
+                MSFS_Executor.get("primitive", settings.decode_workers or os.cpu_count()),
+                self.properties.constant_attributes,
+            )
+
+    @on_built_asset
+    def gather_import_scene_after_animation_hook(self, gltf_scene, blender_scene, gltf):
+        MSFS_Texture.trim_texture_cache(gltf)
+
+        if hasattr(gltf, "msfs_accessor_cache"):
+            stats = gltf.msfs_accessor_cache.stats()
+            gltf2_io_debug.print_console(
+                "INFO",
+                f"Accessor cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions, {stats['bytes'] / (1024 * 1024):.1f} MB cached",
+            )
+
+        profiler = MSFS_Profiler.get(gltf)
+        if profiler is not None:
+            profiler.record("import_scene", os.path.basename(gltf.import_settings["filepath"]), profiler.origin, time.perf_counter() - profiler.origin)
+            profiler.finish()
+            profiler.print_summary()
+
+            profile_path = bpy.path.abspath(self.properties.profile_path) or os.path.join(
+                tempfile.gettempdir(),
+                "msfs-blender-tools",
+                "profiles",
+                f"{os.path.splitext(os.path.basename(gltf.import_settings['filepath']))[0]}-{time.strftime('%Y%m%d-%H%M%S')}.json",
+            )
+            for path in profiler.write(profile_path):
+                gltf2_io_debug.print_console("INFO", f"Import profile written to {path}")
+
+        Import.release(gltf)
 
     @on_built_asset
     def gather_import_decode_primitive(self, gltf_mesh, gltf_primitive, skin_idx, import_settings):
-        MSFS_Primitive.decode_primitive(import_settings, gltf_mesh, gltf_primitive)
+        with MSFS_Profiler.stage(import_settings, "decode_primitive", gltf_mesh.name):
+            MSFS_Primitive.decode_primitive(
+                import_settings, gltf_mesh, gltf_primitive, self.properties.vertex_compaction, self.properties.constant_attributes
+            )
 
     @on_built_asset
     def gather_import_mesh_options(self, mesh_options, gltf_mesh, skin_idx, import_settings):
         mesh_options.skin_into_bind_pose = False # The MSFS build process already calculates bind pose on the vertex locations, so if we do it again it will cause many visual errors
         mesh_options.use_auto_smooth = False # For some reason using auto smooth on built files causes shading issues, so we disable it
 
+    @on_built_asset
+    def gather_import_image_before_hook(self, gltf_img, import_settings):
+        MSFS_Texture.decode_pending_image(import_settings, gltf_img)
+
     @on_built_asset
     def gather_import_image_after_hook(self, gltf_img, blender_image, import_settings):
         MSFS_Texture.rename_image(import_settings, gltf_img, blender_image)
-        MSFS_Texture.convert_normal_map(import_settings, gltf_img, blender_image)
+        MSFS_Texture.tag_proxy(import_settings, gltf_img, blender_image)
+        with MSFS_Profiler.stage(import_settings, "load_pixels", blender_image.name):
+            MSFS_Texture.load_pixels(import_settings, gltf_img, blender_image)
 
     @on_built_asset
     def gather_import_animations(self, gltf_animations, animation_options, import_settings):
         animation_options.restore_first_anim = False # We don't want to restore the first animation as it causes issues at export
+
+
+def unregister():
+    MSFS_Executor.shutdown()
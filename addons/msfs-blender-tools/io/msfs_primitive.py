@@ -16,18 +16,19 @@
 
 import numpy as np
 from io_scene_gltf2.io.com.gltf2_io import Accessor, BufferView
-from io_scene_gltf2.io.com.gltf2_io_constants import ComponentType
-from io_scene_gltf2.io.imp.gltf2_io_binary import BinaryData
 
-from .msfs_binary import MSFS_Binary
+from ..core.msfs_binary import ComponentType, MSFS_BufferArena
+from ..core.msfs_primitive_decoder import MSFS_PrimitiveDecoder
+from ..core.msfs_progress import MSFS_Progress
 
 
 # TODO: RuntimeWarning: invalid value encountered in true_divide RuntimeWarning: invalid value encountered in multiply large_result = 1.055 * np.power(color, 1.0 / 2.4, where=not_small) - 0.055
 
 
 class MSFS_Primitive:
+    """Registers primitives decoded by MSFS_PrimitiveDecoder with the Khronos importer."""
 
-    SerializedName = "ASOBO_primitive"
+    SerializedName = MSFS_PrimitiveDecoder.SerializedName
 
     @staticmethod
     def copy_accessor(accessor):
@@ -47,152 +48,176 @@ class MSFS_Primitive:
         )
 
     @staticmethod
-    def decode_primitive(gltf, gltf_mesh, gltf_prim):
-        if (
-            gltf_prim.extras is not None
-            and MSFS_Primitive.SerializedName in gltf_prim.extras
-        ):
-            if gltf_prim.indices is None:
-                return
+    def get_buffer_arena(gltf):
+        """Returns the buffer arena all decoded data of an import is packed into, creating it on first use."""
+        if not hasattr(gltf, "msfs_buffer_arena"):
+            gltf.msfs_buffer_arena = MSFS_BufferArena()
+            # Choose a buffer index which does not yet exist, skipping over existing glTF buffers yet to be loaded
+            # and buffers which were generated and did not exist in the initial glTF file.
+            gltf.msfs_buffer_arena_idx = max(len(gltf.data.buffers), max(gltf.buffers, default=-1) + 1)
 
-            print(
-                f"INFO | MSFS Decoder: Decoding primitive {gltf_mesh.primitives.index(gltf_prim)} for mesh {gltf_mesh.name}"
-            )
+        return gltf.msfs_buffer_arena
 
-            extension = gltf_prim.extras[MSFS_Primitive.SerializedName]
-
-            indices = MSFS_Binary.decode_accessor(gltf, gltf_prim.indices)
-            indices = indices.reshape(len(indices))
-
-            base_vertex_index = 0
-            primitive_count = 0
-            start_index = 0
-
-            # While it would be more efficient to do `extension.get(PROPERTY, 0)`, unfortunately there are cases where the key is present but with a null value
-            if extension.get("BaseVertexIndex"):
-                base_vertex_index = extension.get("BaseVertexIndex")
-            if extension.get("PrimitiveCount"):
-                primitive_count = extension.get("PrimitiveCount")
-            if extension.get("StartIndex"):
-                start_index = extension.get("StartIndex")
-
-            new_indices = np.array(
-                [
-                    x + base_vertex_index
-                    for x in indices[
-                        start_index : (start_index + (primitive_count * 3))
-                    ]
-                ]
+    @staticmethod
+    def pack_array(gltf, array, component_type):
+        """
+        Packs a decoded array, converted to component_type, into the import's buffer arena and returns the index of a new buffer view onto it.
+        All decoded data shares a single glTF buffer, whose index is picked once per import.
+        """
+        arena = MSFS_Primitive.get_buffer_arena(gltf)
+        byte_offset, byte_length = arena.append(array, ComponentType.to_numpy_dtype(component_type))
+        gltf.buffers[gltf.msfs_buffer_arena_idx] = arena.view() # The arena may have grown into new storage
+
+        # Create a buffer view referencing the packed data
+        gltf.data.buffer_views.append(
+            BufferView.from_dict(
+                {
+                    "buffer": gltf.msfs_buffer_arena_idx,
+                    "byteOffset": byte_offset,
+                    "byteLength": byte_length,
+                }
             )
+        )
+        return len(gltf.data.buffer_views) - 1
 
-            # We have to flip face vertex order. For example: a face with indices [1, 2, 3] will become [3, 2, 1]. We need to do this to ensure the normals are facing the correct way
-            # First, Group indices into faces (groups of 3)
-            new_indices = new_indices.reshape(-1, 3)
-            # Flip faces
-            new_indices = new_indices[:, ::-1]
-            # Flatten
-            new_indices = new_indices.flatten()
-
-            # Set correct data type
-            max_index = new_indices.max()
-            if max_index < 65535:
-                component_type = ComponentType.UnsignedShort
-                new_indices = new_indices.astype(np.uint16, copy=False)
-            elif max_index < 4294967295:
-                component_type = ComponentType.UnsignedInt
-                new_indices = new_indices.astype(np.uint32, copy=False)
-            else:
-                raise RuntimeError(
-                    f"Mesh {gltf_mesh.name} contains too many vertices"
-                )  # Not sure if this will ever happen, but check just in case
+    @staticmethod
+    def constant_buffer_view(gltf, key, count, component_type):
+        """
+        Returns the index of a buffer view holding at least count rows of the constant attribute of key (see MSFS_PrimitiveDecoder.constant_key).
+        Every accessor of the same constant points at the start of one shared buffer view, it is only packed again when a
+        primitive needs more rows than it holds.
+        """
+        if not hasattr(gltf, "msfs_constant_buffer_views"):
+            gltf.msfs_constant_buffer_views = {}
+
+        _, conversion, component_count, _, _ = key
+        buffer_key = (conversion, component_count, component_type)
+        buffer_view_idx, capacity = gltf.msfs_constant_buffer_views.get(buffer_key, (None, -1))
+        if count > capacity:
+            # Grow geometrically, so primitives of increasing size don't pack it over and over
+            capacity = max(count, capacity * 2)
+            value, _ = MSFS_PrimitiveDecoder.ConstantAttributes[conversion]
+            data = np.broadcast_to(np.array(value, dtype=ComponentType.to_numpy_dtype(component_type)), (capacity, component_count))
+            buffer_view_idx = MSFS_Primitive.pack_array(gltf, data, component_type)
+            gltf.msfs_constant_buffer_views[buffer_key] = (buffer_view_idx, capacity)
+
+        return buffer_view_idx
 
-            # Choose a buffer index which does not yet exist, skipping over existing glTF buffers yet to be loaded
-            # and buffers which were generated and did not exist in the initial glTF file.
-            base_buffer_idx = len(gltf.data.buffers)
-            for existing_buffer_idx in gltf.buffers:
-                if base_buffer_idx <= existing_buffer_idx:
-                    base_buffer_idx = existing_buffer_idx + 1
-
-            # Generate new buffer holding the new indices
-            gltf.buffers[base_buffer_idx] = new_indices.tobytes()
-
-            # Create a buffer view referencing the new buffer
-            gltf.data.buffer_views.append(
-                BufferView.from_dict(
-                    {
-                        "buffer": base_buffer_idx,
-                        "byteLength": len(new_indices.tobytes()),
-                    }
-                )
-            )
+    @staticmethod
+    def decode_primitives(gltf, vertex_compaction="NONE", executor=None, constant_attributes="SHARE"):
+        """
+        Decodes every ASOBO_primitive primitive ahead of the mesh pass, concurrently on executor.
+        The results are kept until the importer reaches each mesh, where decode_primitive installs them.
+        """
+        primitives = [
+            (gltf_mesh, gltf_prim)
+            for gltf_mesh in gltf.data.meshes or []
+            for gltf_prim in gltf_mesh.primitives
+        ]
+        decoded = MSFS_PrimitiveDecoder.decode_primitives(
+            gltf, primitives, vertex_compaction, executor, progress=MSFS_Progress.get(gltf)
+        )
 
-            # Create new accessor with the decoded data
-            new_accessor = MSFS_Primitive.copy_accessor(
-                gltf.data.accessors[gltf_prim.indices]
-            )
-            new_accessor.buffer_view = len(gltf.data.buffer_views) - 1
-            new_accessor.component_type = component_type
-            new_accessor.count = len(new_indices)
+        # Size the arena for everything up front, so it never has to grow while packing
+        byte_length = 0
+        keys = set()
+        constants = {} # Largest constant attribute of each shared buffer: (key, component type) by buffer
+        for gltf_prim, (new_indices, _, attributes) in decoded.items():
+            byte_length += new_indices.nbytes + MSFS_BufferArena.Alignment
+            for attr, (key, data, properties) in attributes.items():
+                if data is None or key in keys:
+                    continue
+                if key is not None:
+                    keys.add(key)
+
+                component_type = properties.get("component_type", gltf.data.accessors[gltf_prim.attributes[attr]].component_type)
+                if MSFS_PrimitiveDecoder.is_constant_key(key):
+                    if constant_attributes == "SHARE":
+                        buffer_key = (key[1], key[2], component_type)
+                        if buffer_key not in constants or key[3] > constants[buffer_key][0][3]:
+                            constants[buffer_key] = (key, component_type)
+                    continue
+
+                byte_length += data.size * np.dtype(ComponentType.to_numpy_dtype(component_type)).itemsize + MSFS_BufferArena.Alignment
+        for key, component_type in constants.values():
+            byte_length += key[2] * key[3] * np.dtype(ComponentType.to_numpy_dtype(component_type)).itemsize + MSFS_BufferArena.Alignment
+        MSFS_Primitive.get_buffer_arena(gltf).reserve(byte_length)
+
+        # Pack each shared constant buffer at its final size right away
+        for key, component_type in constants.values():
+            MSFS_Primitive.constant_buffer_view(gltf, key, key[3], component_type)
+
+        if not hasattr(gltf, "decoded_primitives"):
+            gltf.decoded_primitives = {}
+        gltf.decoded_primitives.update(decoded)
+
+        print(f"INFO | MSFS Decoder: Decoded {len(decoded)} primitives")
+
+    @staticmethod
+    def decode_primitive(gltf, gltf_mesh, gltf_prim, vertex_compaction="NONE", constant_attributes="SHARE"):
+        # Asobo packs the vertices of many primitives into a single vertex buffer, so the same attribute accessors are
+        # referenced by every primitive sharing it. Decoded attributes are kept per import, keyed by source accessor,
+        # conversion and vertex range, so each shared vertex buffer is only decoded and stored once.
+        # Constant attributes are either left out of the primitive ("DROP"), or point at a single buffer shared by all primitives ("SHARE")
+        if not hasattr(gltf, "decoded_attribute_accessors"):
+            gltf.decoded_attribute_accessors = {}
+        if not hasattr(gltf, "installed_primitives"):
+            gltf.installed_primitives = set()
+
+        # The importer asks again for every skin a mesh is used with, by then the primitive was already replaced by its decoded version
+        if gltf_prim in gltf.installed_primitives:
+            return
+
+        decoded = getattr(gltf, "decoded_primitives", {}).pop(gltf_prim, None)
+        if decoded is None:
+            # Not decoded ahead of time, decode it now
+            decoded = MSFS_PrimitiveDecoder.decode_primitives(
+                gltf, [(gltf_mesh, gltf_prim)], vertex_compaction, decoded_keys=gltf.decoded_attribute_accessors
+            ).get(gltf_prim)
+            if decoded is None:
+                return
+
+        new_indices, component_type, attributes = decoded
+
+        # Create new accessor with the decoded data
+        new_accessor = MSFS_Primitive.copy_accessor(
+            gltf.data.accessors[gltf_prim.indices]
+        )
+        new_accessor.buffer_view = MSFS_Primitive.pack_array(gltf, new_indices, component_type)
+        new_accessor.component_type = component_type
+        new_accessor.count = len(new_indices)
+        new_accessor.byte_offset = 0
+
+        # Set the new accessor
+        gltf.data.accessors.append(new_accessor)
+        gltf_prim.indices = len(gltf.data.accessors) - 1
+
+        for attr, (decoded_key, data, properties) in attributes.items():
+            constant = MSFS_PrimitiveDecoder.is_constant_key(decoded_key)
+            if constant and constant_attributes == "DROP":
+                del gltf_prim.attributes[attr]
+                continue
+
+            if decoded_key in gltf.decoded_attribute_accessors:
+                gltf_prim.attributes[attr] = gltf.decoded_attribute_accessors[decoded_key]
+                continue
+
+            # Create a new accessor with the decoded data
+            new_accessor = MSFS_Primitive.copy_accessor(gltf.data.accessors[gltf_prim.attributes[attr]])
+            for name, value in properties.items():
+                setattr(new_accessor, name, value)
+
+            # Pack the new attribute, converting it to its final type on the way
+            if constant:
+                new_accessor.buffer_view = MSFS_Primitive.constant_buffer_view(gltf, decoded_key, len(data), new_accessor.component_type)
+            else:
+                new_accessor.buffer_view = MSFS_Primitive.pack_array(gltf, data, new_accessor.component_type)
             new_accessor.byte_offset = 0
 
             # Set the new accessor
             gltf.data.accessors.append(new_accessor)
-            gltf_prim.indices = len(gltf.data.accessors) - 1
-
-            # Read each attribute
-            for attr_idx, (attr, accessor_idx) in enumerate(
-                gltf_prim.attributes.items()
-            ):
-                accessor = gltf.data.accessors[accessor_idx]
-
-                # Create a new accessor with the decoded data
-                new_accessor = MSFS_Primitive.copy_accessor(accessor)
-
-                data = MSFS_Binary.decode_accessor(gltf, gltf_prim.attributes[attr])
-
-                # Handle certain attributes
-                # TODO: color, tangent, texcoord, normal?
-                if attr == "NORMAL":
-                    # For some reason the normal attribute has a 4th value - we only need three. TODO: figure out what to do with last normal value
-                    data = data[:, :-1]
-                    # Since we flipped indices order, flip normals
-                    data = np.negative(data)
-                    new_accessor.type = "VEC3"
-                elif attr.startswith("COLOR_"):
-                    data = np.zeros(data.shape) # Disregard all previous values - MSFS always sets these values to 15360
-                    data.fill(15360)
-                    new_accessor.component_type = ComponentType.UnsignedShort
-                elif attr.startswith("TEXCOORD_"):
-                    new_accessor.component_type = ComponentType.Float
-                elif attr.startswith("JOINTS_"):
-                    # Joint data needs to have 4 values - BLEND1 primitives only have 1
-                    if extension.get("VertexType") == "BLEND1":
-                        data = np.pad(data, (0, 4 - data.shape[1]))
-                    new_accessor.type = "VEC4"
-                elif attr.startswith("WEIGHTS_"):
-                    # Weight data needs to have 4 values - BLEND1 primitives only have 1
-                    if extension.get("VertexType") == "BLEND1":
-                        data = np.pad(data, (0, 4 - data.shape[1]))
-                    new_accessor.type = "VEC4"
-                    new_accessor.normalized = None
-                    new_accessor.component_type = ComponentType.Float
-
-                data = data.astype(ComponentType.to_numpy_dtype(new_accessor.component_type)).tobytes()
-
-                # Generate new buffer holding the new attribute
-                buffer_idx = base_buffer_idx + 1 + attr_idx
-                gltf.buffers[buffer_idx] = data
-
-                # Create a buffer view referencing the new buffer
-                gltf.data.buffer_views.append(
-                    BufferView.from_dict(
-                        {"buffer": buffer_idx, "byteLength": len(data)}
-                    )
-                )
-
-                new_accessor.buffer_view = len(gltf.data.buffer_views) - 1
-                new_accessor.byte_offset = 0
-
-                # Set the new accessor
-                gltf.data.accessors.append(new_accessor)
-                gltf_prim.attributes[attr] = len(gltf.data.accessors) - 1
+            gltf_prim.attributes[attr] = len(gltf.data.accessors) - 1
+            if decoded_key is not None:
+                gltf.decoded_attribute_accessors[decoded_key] = gltf_prim.attributes[attr]
+
+        gltf.installed_primitives.add(gltf_prim)
@@ -0,0 +1,70 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import bpy
+import time
+
+from ..core.msfs_progress import MSFS_Progress
+
+
+class MSFS_ImportProgress(MSFS_Progress):
+    """
+    Shows the progress of an import through the window manager progress indicator and the status bar, and as periodic console lines.
+    Blender doesn't handle events while the import runs, so the import is cancelled with Ctrl+C in the system console (see MSFS_Progress).
+    """
+
+    ConsoleInterval = 1.0
+
+    cancellations = 0 # Number of imports cancelled in this session, so a batch import can stop once one of its imports was cancelled
+
+    def __init__(self):
+        super().__init__()
+        self.shown_stage = None
+        self.last_print = 0.0
+
+    def cancel(self):
+        if not self.cancelled.is_set():
+            MSFS_ImportProgress.cancellations += 1
+        super().cancel()
+
+    def set_status_text(self, text):
+        workspace = bpy.context.workspace # None when running in the background
+        if workspace is not None:
+            workspace.status_text_set(text)
+
+    def report(self):
+        window_manager = bpy.context.window_manager
+
+        if self.stage is None:
+            if self.shown_stage is not None:
+                window_manager.progress_end()
+                self.set_status_text(None)
+                self.shown_stage = None
+            return
+
+        if self.shown_stage != self.stage:
+            if self.shown_stage is not None:
+                window_manager.progress_end()
+            window_manager.progress_begin(0, max(self.total, 1))
+            self.shown_stage = self.stage
+
+        window_manager.progress_update(self.done)
+        self.set_status_text(f"MSFS import: {self.status()} (Ctrl+C in the console to cancel)")
+
+        now = time.perf_counter()
+        if now - self.last_print >= MSFS_ImportProgress.ConsoleInterval or self.done >= self.total:
+            self.last_print = now
+            print(f"INFO | MSFS Decoder: {self.status()}")
@@ -16,19 +16,31 @@
 
 import os
 import bpy
-import json
-import base64
 import numpy as np
-import configparser
-from io import BytesIO
 
 from io_scene_gltf2.io.com import gltf2_io_debug
 
+from ..core.msfs_profiler import MSFS_Profiler
+from ..core.msfs_progress import MSFS_Progress
+from ..core.msfs_settings import MSFS_Settings
+from ..core.msfs_texture_cache import MSFS_TextureCache
+from ..core.msfs_texture_decoder import MSFS_TextureDecoder
+
 # TODO: maybe convert before material import runs in order to get texture values to set properly, normals issue, other material import issues, list indices must be integers or slices, not NoneType
 
 class MSFS_Texture:
+    """Hands the textures decoded by MSFS_TextureDecoder to the Blender images created by the Khronos importer."""
+
+    SerializedName = MSFS_TextureDecoder.SerializedName
+    PlaceholderURI = MSFS_TextureDecoder.PlaceholderURI
 
-    SerializedName = "MSFT_texture_dds"
+    # Custom properties recording where reduced resolution (proxy) images come from, so they can be upgraded to full resolution later
+    ProxyPathProperty = "msfs_texture_path"
+    ProxyFlagsProperty = "msfs_texture_flags"
+    ProxySizeProperty = "msfs_original_size"
+
+    # Custom property marking images whose decoded pixels only live in memory until they are packed (see pack_images)
+    UnpackedProperty = "msfs_unpacked"
 
     @staticmethod
     def rename_image(gltf, gltf_img, blender_image):
@@ -37,126 +49,181 @@ class MSFS_Texture:
             gltf_img.blender_image_name = blender_image.name
 
     @staticmethod
-    def convert_normal_map(gltf, gltf_img, blender_image):
-        if (
-            hasattr(gltf, "normals_needing_conversion")
-            and gltf_img in gltf.normals_needing_conversion
-        ):
-            # Asobo normal maps have no z (blue) channel, so we have to calculate one, as well as flip the y (green) channel
-            width = blender_image.size[0]
-            height = blender_image.size[1]
-            pixels = np.empty(width * height * 4, dtype=np.float32)
-            blender_image.pixels.foreach_get(pixels)
-            pixels = pixels.reshape((-1, 4))
-            rgb_pixels = pixels[:, 0:3]
-            rgb_pixels[:, 1] = 1.0 - rgb_pixels[:, 1]
-            rgb_pixels[:, 2] = np.sqrt(
-                1 - (rgb_pixels[:, 0] - 0.5) ** 2 - (rgb_pixels[:, 1] - 0.5) ** 2
-            )
-            pixel_data = pixels.reshape((-1, 1)).transpose()[0]
-            blender_image.pixels.foreach_set(pixel_data)
-            blender_image.update()
+    def set_pixels(blender_image, pixels):
+        """
+        Replaces the pixels of a Blender image with decoded height x width x 4 RGBA pixels, held in memory as a generated image.
+        Nothing is encoded here, the image is marked so pack_images packs it when the .blend file is saved.
+        """
+        height, width = pixels.shape[:2]
+
+        # Blender stores pixels bottom to top as floats, so flip the rows while converting straight into the float buffer
+        pixel_data = np.empty(width * height * 4, dtype=np.float32)
+        np.multiply(
+            pixels[::-1],
+            np.float32(1 / 255),
+            out=pixel_data.reshape(pixels.shape),
+            dtype=np.float32,
+        )
+
+        # The importer packed the placeholder, which would come back when the .blend is reloaded. Drop it and turn the image
+        # into a generated one, whose buffer holds the decoded pixels
+        if blender_image.packed_file is not None:
+            blender_image.unpack(method="REMOVE")
+        blender_image.source = "GENERATED"
+        blender_image.generated_width = width
+        blender_image.generated_height = height
+
+        blender_image.pixels.foreach_set(pixel_data)
+        blender_image.update()
+        blender_image[MSFS_Texture.UnpackedProperty] = True
 
     @staticmethod
-    def convert_textures(gltf):
+    def pack_images(images):
         """
-        Convert all textures from DDS to PNG before scene creation.
-        Use PIL to open the DDS image, and embed the image data into the glTF file. That way we don't need to write anything to disk (slow)
+        Packs images loaded by set_pixels into the .blend file, so they survive saving it. Blender encodes each image to PNG on
+        the main thread, which is why this runs when the file is saved (see pack_textures_on_save) rather than during the import.
+        Returns the number of images packed.
         """
-        from PIL import Image
-
-        for gltf_texture in gltf.data.textures:
-            if (
-                gltf_texture.extensions is not None
-                and MSFS_Texture.SerializedName in gltf_texture.extensions
-            ):
-                addon_settings = bpy.context.preferences.addons[
-                    os.path.splitext(__package__)[0]
-                ].preferences
-
-                source = gltf.data.images[
-                    gltf_texture.extensions[MSFS_Texture.SerializedName].get("source") # TODO: cases where referencing image already converted
-                ]
-
-                if source.uri.startswith("data:application/octet-stream;base64,"):
-                    gltf2_io_debug.print_console("INFO", f"Texture already converted, skipping")
-                    gltf_texture.extensions = None
-                    gltf_texture.source = gltf.data.images.index(source)
-                    continue
-
-                gltf2_io_debug.print_console("INFO", f"Converting texture {source.uri}")
-
-                # Assume we are in a proper structured project
-                textures_folder = os.path.join(
-                    os.path.dirname(os.path.dirname(gltf.import_settings["filepath"])),
-                    "TEXTURE",
+        packed = 0
+        for image in images:
+            if MSFS_Texture.UnpackedProperty not in image:
+                continue
+            image.pack()
+            del image[MSFS_Texture.UnpackedProperty]
+            packed += 1
+        return packed
+
+    @staticmethod
+    def load_pixels(gltf, gltf_img, blender_image):
+        if hasattr(gltf, "decoded_images") and gltf_img in gltf.decoded_images:
+            MSFS_Texture.set_pixels(blender_image, gltf.decoded_images.pop(gltf_img))
+
+    @staticmethod
+    def record_proxy(gltf, gltf_img, conversion, pixels):
+        """Remembers the full resolution of an image decoded at reduced resolution."""
+        if not getattr(gltf, "texture_max_size", 0):
+            return
+
+        texture_path, flags = conversion
+        width, height = MSFS_TextureDecoder.image_size(texture_path)
+        if pixels.shape[:2] != (height, width):
+            if not hasattr(gltf, "proxy_images"):
+                gltf.proxy_images = {}
+            gltf.proxy_images[gltf_img] = (texture_path, flags, width, height)
+
+    @staticmethod
+    def tag_proxy(gltf, gltf_img, blender_image):
+        """Records the source and full resolution of a reduced resolution image on the Blender image (see FBW_OT_upgrade_proxy_textures)."""
+        if hasattr(gltf, "proxy_images") and gltf_img in gltf.proxy_images:
+            texture_path, flags, width, height = gltf.proxy_images.pop(gltf_img)
+            blender_image[MSFS_Texture.ProxyPathProperty] = texture_path
+            blender_image[MSFS_Texture.ProxyFlagsProperty] = ",".join(flags)
+            blender_image[MSFS_Texture.ProxySizeProperty] = (width, height)
+
+    @staticmethod
+    def proxy_conversion(blender_image):
+        """Returns the (texture path, flags) a reduced resolution image was decoded from, or None if it isn't one."""
+        if MSFS_Texture.ProxyPathProperty not in blender_image:
+            return None
+
+        flags = blender_image.get(MSFS_Texture.ProxyFlagsProperty, "")
+        return blender_image[MSFS_Texture.ProxyPathProperty], [flag for flag in flags.split(",") if flag]
+
+    @staticmethod
+    def clear_proxy(blender_image):
+        for name in (MSFS_Texture.ProxyPathProperty, MSFS_Texture.ProxyFlagsProperty, MSFS_Texture.ProxySizeProperty):
+            if name in blender_image:
+                del blender_image[name]
+
+    @staticmethod
+    def convert_textures(gltf, lazy=False, max_size=0):
+        """
+        Decode all DDS textures before scene creation.
+        Use PIL to decode the DDS image, and keep the RGBA pixels until the Khronos importer creates the Blender image, where
+        they are loaded directly. That way we don't need to write anything to disk or encode any intermediate format (slow)
+        Textures are decoded concurrently on a worker pool, the results are applied in texture order
+        In lazy mode textures are only resolved here, and decoded by decode_pending_image once the importer creates their image.
+        Otherwise the decoded pixels are held until then, up to the decoded texture budget, and the textures past it are decoded lazily
+        With max_size set, textures are read from a reduced resolution mip level, and their full resolution is recorded on the image
+        """
+        settings = MSFS_Settings.from_preferences(
+            bpy.context.preferences.addons[os.path.splitext(__package__)[0]].preferences
+        )
+
+        # Lazy imports only read the textures they materialize, so don't read every file to compare contents
+        conversions = MSFS_TextureDecoder.find_conversions(gltf, settings, deduplicate_contents=not lazy)
+        if not conversions:
+            return
+
+        if not hasattr(gltf, "decoded_images"):
+            gltf.decoded_images = {}
+        if not hasattr(gltf, "pending_images"):
+            gltf.pending_images = {}
+        if not hasattr(gltf, "packed_image_names"):
+            gltf.packed_image_names = {}
+
+        gltf.texture_cache = MSFS_TextureCache.from_settings(settings)
+        gltf.texture_max_size = max_size
+
+        for source in conversions:
+            # The Khronos importer sets packed image names with placeholder values. We want to make sure we respect the original names
+            gltf.packed_image_names[source] = source.uri.split('.')[0] # Remove extensions from filename
+
+        if lazy:
+            for source, conversion in conversions.items():
+                gltf.pending_images[source] = conversion
+                source.uri = MSFS_Texture.PlaceholderURI
+            return
+
+        results = MSFS_TextureDecoder.decode_conversions(
+            conversions, settings, gltf.texture_cache, MSFS_Profiler.get(gltf), MSFS_Progress.get(gltf), max_size
+        )
+
+        # Decoded pixels wait here until the scene is created, so stop decoding ahead once they take up the budget.
+        # Closing the results cancels the conversions not started yet
+        budget = settings.decoded_texture_budget * 1024 * 1024
+        decoded_bytes = 0
+        try:
+            # Results are yielded in submission order, so images are always updated in the same order
+            for source, pixels in results:
+                gltf2_io_debug.print_console("INFO", f"Converted texture {source.uri}")
+
+                gltf.decoded_images[source] = pixels
+                MSFS_Texture.record_proxy(gltf, source, conversions[source], pixels)
+                source.uri = MSFS_Texture.PlaceholderURI
+
+                decoded_bytes += pixels.nbytes
+                if budget and decoded_bytes >= budget:
+                    break
+        finally:
+            results.close()
+
+        # The remaining textures are decoded once their image is created, as in lazy mode
+        deferred = 0
+        for source, conversion in conversions.items():
+            if source not in gltf.decoded_images:
+                gltf.pending_images[source] = conversion
+                source.uri = MSFS_Texture.PlaceholderURI
+                deferred += 1
+        if deferred:
+            gltf2_io_debug.print_console(
+                "INFO", f"Decoded textures reached the {settings.decoded_texture_budget} MB budget, {deferred} textures are decoded once their image is created"
+            )
+
+    @staticmethod
+    def decode_pending_image(gltf, gltf_img):
+        """Decode a texture deferred by a lazy convert_textures, now that the importer is creating its image."""
+        if hasattr(gltf, "pending_images") and gltf_img in gltf.pending_images:
+            texture_path, flags = gltf.pending_images.pop(gltf_img)
+            gltf2_io_debug.print_console("INFO", f"Converting texture {os.path.basename(texture_path)}")
+            with MSFS_Profiler.stage(gltf, "decode_image", os.path.basename(texture_path)) as stage:
+                gltf.decoded_images[gltf_img] = MSFS_TextureDecoder.decode_image(
+                    texture_path, flags, gltf.texture_cache, gltf.texture_max_size
                 )
+                stage.bytes = gltf.decoded_images[gltf_img].nbytes
+            MSFS_Texture.record_proxy(gltf, gltf_img, (texture_path, flags), gltf.decoded_images[gltf_img])
 
-                texture_path = os.path.join(textures_folder, source.uri)
-                if os.path.exists(texture_path):
-                    pass
-                else:
-                    # Use fallbacks in the texture.cfg
-                    texture_config_path = os.path.join(textures_folder, "texture.cfg")
-                    if not os.path.exists(texture_config_path):
-                        gltf2_io_debug.print_console("WARNING", f"Texture {source.uri} failed to convert")
-                        continue
-
-                    parser = configparser.ConfigParser()
-                    parser.read(texture_config_path)
-
-                    if "fltsim" not in parser:
-                        gltf2_io_debug.print_console("WARNING", f"Texture {source.uri} failed to convert")
-                        continue
-
-                    fltsim = parser["fltsim"]
-                    for fallback in list(fltsim):
-                        fallback_path = os.path.join(
-                            addon_settings.fs_base_dir or "",
-                            fltsim[fallback].split(".")[-1],
-                        )
-
-                        if not os.path.exists(fallback_path):
-                            gltf2_io_debug.print_console("WARNING", f"Texture {source.uri} failed to convert")
-                            continue
-
-                        fallback_texture_path = os.path.join(fallback_path, source.uri)
-                        if os.path.exists(fallback_texture_path):
-                            texture_path = fallback_texture_path
-                            break
-
-                    if not os.path.exists(texture_path):
-                        gltf2_io_debug.print_console("WARNING", f"Texture {source.uri} failed to convert")
-                        continue
-
-                # Now we read the texture
-                image = Image.open(texture_path)
-
-                # Check JSON
-                image_json = texture_path + ".json"
-                if os.path.exists(image_json):
-                    with open(image_json, "r") as f:
-                        data = json.loads(f.read())
-
-                    if "FL_BITMAP_TANGENT_DXT5N" in data.get("Flags", []):
-                        # During the build process, many changes are applied to the normal maps. We want to undo that
-                        if not hasattr(gltf, "normals_needing_conversion"):
-                            gltf.normals_needing_conversion = []
-                        gltf.normals_needing_conversion.append(source)
-
-                # Create buffer view
-                buffer = BytesIO()
-                image.save(buffer, format="PNG") # TODO: this performance is so awful
-
-                data = "data:application/octet-stream;base64," + base64.b64encode(
-                    buffer.getvalue()
-                ).decode("ascii")
-
-                # The Khronos importer sets packed image names with placeholder values. We want to make sure we respect the original names
-                if not hasattr(gltf, "packed_image_names"):
-                    gltf.packed_image_names = {}
-                gltf.packed_image_names[source] = source.uri.split('.')[0] # Remove extensions from filename
-
-                source.uri = data
-                gltf_texture.extensions = None
-                gltf_texture.source = gltf.data.images.index(source)
+    @staticmethod
+    def trim_texture_cache(gltf):
+        if getattr(gltf, "texture_cache", None) is not None:
+            gltf.texture_cache.trim()
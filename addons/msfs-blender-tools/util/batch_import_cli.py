@@ -0,0 +1,53 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Headless batch import of MSFS glTF files. Run with:
+#   blender --background --python util/batch_import_cli.py -- [--report report.json] [--save out.blend] <file.gltf | package directory> ...
+
+import os
+import sys
+import argparse
+import importlib
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog="blender --background --python batch_import_cli.py --",
+        description="Import many MSFS glTF files, or every glTF file in a package directory, in a single Blender session",
+    )
+    parser.add_argument("paths", nargs="+", help="glTF files or package directories to import")
+    parser.add_argument("--report", help="Write the per-file timings to this JSON file")
+    parser.add_argument("--save", help="Save the resulting scene to this .blend file")
+    args = parser.parse_args(argv)
+
+    import bpy
+    import addon_utils
+
+    # This script runs outside of the add-on package, so enable the add-on it lives in and import the batch importer from it
+    addon_name = os.path.basename(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+    addon_utils.enable(addon_name, default_set=True)
+    msfs_batch_import = importlib.import_module(f"{addon_name}.io.msfs_batch_import")
+
+    results = msfs_batch_import.batch_import([os.path.abspath(path) for path in args.paths], args.report)
+
+    if args.save:
+        bpy.ops.wm.save_as_mainfile(filepath=os.path.abspath(args.save))
+
+    return 0 if results and all(result["status"] == "FINISHED" for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else []))
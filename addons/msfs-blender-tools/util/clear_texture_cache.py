@@ -0,0 +1,40 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import bpy
+
+from ..core.msfs_texture_cache import MSFS_TextureCache
+
+
+class FBW_OT_clear_texture_cache(bpy.types.Operator):
+    bl_idname = "fbw.clear_texture_cache"
+    bl_label = "Clear texture cache"
+    bl_description = "Deletes all converted textures stored in the texture cache. The next import will convert every texture again"
+    bl_options = {"REGISTER", "INTERNAL"}
+
+    def execute(self, context):
+        addon_settings = context.preferences.addons[
+            os.path.splitext(__package__)[0]
+        ].preferences
+
+        MSFS_TextureCache(
+            addon_settings.texture_cache_dir or MSFS_TextureCache.default_directory(),
+            addon_settings.texture_cache_size * 1024 * 1024,
+        ).clear()
+
+        self.report({"INFO"}, "Texture cache cleared")
+        return {"FINISHED"}
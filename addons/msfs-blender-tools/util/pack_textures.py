@@ -0,0 +1,67 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import bpy
+from bpy.app.handlers import persistent
+from io_scene_gltf2.io.com import gltf2_io_debug
+
+from ..io.msfs_texture import MSFS_Texture
+
+
+class FBW_OT_pack_textures(bpy.types.Operator):
+    bl_idname = "fbw.pack_textures"
+    bl_label = "Pack MSFS Textures"
+    bl_description = "Packs the imported MSFS textures into the .blend file now, instead of when it is saved. Each texture is encoded to PNG, which takes a while for large imports"
+    bl_options = {"REGISTER", "UNDO"}
+
+    @classmethod
+    def poll(cls, context):
+        return any(MSFS_Texture.UnpackedProperty in image for image in bpy.data.images)
+
+    def execute(self, context):
+        packed = MSFS_Texture.pack_images(bpy.data.images)
+        self.report({"INFO"}, f"Packed {packed} textures")
+        return {"FINISHED"}
+
+
+def menu_func_external_data(self, context):
+    self.layout.operator(FBW_OT_pack_textures.bl_idname)
+
+
+@persistent
+def pack_textures_on_save(*args):
+    # Imported textures only live in memory, they would come back blank when the file is reloaded
+    packed = MSFS_Texture.pack_images(bpy.data.images)
+    if packed:
+        gltf2_io_debug.print_console("INFO", f"Packed {packed} MSFS textures into the .blend file")
+
+
+def remove_save_handler():
+    # Match by name, reloading the add-on creates a new function
+    for handler in list(bpy.app.handlers.save_pre):
+        if getattr(handler, "__name__", None) == pack_textures_on_save.__name__:
+            bpy.app.handlers.save_pre.remove(handler)
+
+
+def register():
+    bpy.types.TOPBAR_MT_file_external_data.append(menu_func_external_data)
+    remove_save_handler()
+    bpy.app.handlers.save_pre.append(pack_textures_on_save)
+
+
+def unregister():
+    bpy.types.TOPBAR_MT_file_external_data.remove(menu_func_external_data)
+    remove_save_handler()
@@ -0,0 +1,82 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import bpy
+
+from ..core.msfs_progress import MSFS_ImportCancelled
+from ..core.msfs_settings import MSFS_Settings
+from ..core.msfs_texture_cache import MSFS_TextureCache
+from ..core.msfs_texture_decoder import MSFS_TextureDecoder
+from ..io.msfs_progress import MSFS_ImportProgress
+from ..io.msfs_texture import MSFS_Texture
+
+
+class FBW_OT_upgrade_proxy_textures(bpy.types.Operator):
+    bl_idname = "fbw.upgrade_proxy_textures"
+    bl_label = "Load Full Resolution MSFS Textures"
+    bl_description = "Replaces the reduced resolution textures of imports with a Max Texture Size by their full resolution DDS files"
+    bl_options = {"REGISTER", "UNDO"}
+
+    @classmethod
+    def poll(cls, context):
+        return any(MSFS_Texture.ProxyPathProperty in image for image in bpy.data.images)
+
+    def execute(self, context):
+        settings = MSFS_Settings.from_preferences(
+            context.preferences.addons[os.path.splitext(__package__)[0]].preferences
+        )
+
+        conversions = {}
+        for image in bpy.data.images:
+            conversion = MSFS_Texture.proxy_conversion(image)
+            if conversion is None:
+                continue
+            if not os.path.exists(conversion[0]):
+                self.report({"WARNING"}, f"Texture {conversion[0]} of image {image.name} no longer exists")
+                continue
+            conversions[image] = conversion
+
+        texture_cache = MSFS_TextureCache.from_settings(settings)
+        upgraded = 0
+        try:
+            for image, pixels in MSFS_TextureDecoder.decode_conversions(
+                conversions, settings, texture_cache, progress=MSFS_ImportProgress()
+            ):
+                MSFS_Texture.set_pixels(image, pixels)
+                MSFS_Texture.clear_proxy(image)
+                upgraded += 1
+        except MSFS_ImportCancelled:
+            self.report({"WARNING"}, f"Cancelled, loaded {upgraded}/{len(conversions)} textures at full resolution")
+            return {"FINISHED"}
+        finally:
+            if texture_cache is not None:
+                texture_cache.trim()
+
+        self.report({"INFO"}, f"Loaded {upgraded} textures at full resolution")
+        return {"FINISHED"}
+
+
+def menu_func_external_data(self, context):
+    self.layout.operator(FBW_OT_upgrade_proxy_textures.bl_idname)
+
+
+def register():
+    bpy.types.TOPBAR_MT_file_external_data.append(menu_func_external_data)
+
+
+def unregister():
+    bpy.types.TOPBAR_MT_file_external_data.remove(menu_func_external_data)
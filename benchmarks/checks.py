@@ -0,0 +1,124 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Equivalence checks of optimized decoding paths against the straightforward implementations they replaced, run before every
+benchmark run, or on their own without Blender:
+    python benchmarks/checks.py
+"""
+
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import standins
+
+CHECKS = []
+
+
+def check(name):
+    """Registers a check. The check raises AssertionError describing the first mismatch it finds."""
+
+    def decorator(func):
+        CHECKS.append((name, func))
+        return func
+
+    return decorator
+
+
+def baseline_decode_indices(indices, start_index, primitive_count, base_vertex_index):
+    """The per-index Python loop decode_primitive used to rebase, flip and narrow the indices of a primitive with."""
+    new_indices = np.array([x + base_vertex_index for x in indices[start_index : (start_index + (primitive_count * 3))]])
+    new_indices = new_indices.reshape(-1, 3)[:, ::-1].flatten()
+    if new_indices.max() < 65535:
+        return new_indices.astype(np.uint16, copy=False)
+    return new_indices.astype(np.uint32, copy=False)
+
+
+@check("decode_indices")
+def check_decode_indices():
+    """Primitives of random shared index buffers are decoded by decode_indices and by the per-index loop it replaced."""
+    from msfs_blender_tools.core.msfs_primitive_decoder import MSFS_PrimitiveDecoder
+
+    rng = np.random.default_rng(0)
+    for vertex_count, base_vertex_index in ((1000, 0), (60000, 5535), (60000, 70000)):
+        indices = rng.integers(0, vertex_count, 3 * 4000, dtype=np.uint32)
+        for start_index, primitive_count in ((0, 4000), (300, 1000), (3 * 3999, 1)):
+            expected = baseline_decode_indices(indices, start_index, primitive_count, base_vertex_index)
+            new_indices, _, _ = MSFS_PrimitiveDecoder.decode_indices(indices, start_index, primitive_count, base_vertex_index)
+            if new_indices.dtype != expected.dtype or not np.array_equal(new_indices, expected):
+                raise AssertionError(
+                    f"{vertex_count} vertices from {base_vertex_index}, {primitive_count} primitives from {start_index}: "
+                    f"{new_indices.dtype} {new_indices[:6].tolist()} instead of {expected.dtype} {expected[:6].tolist()}"
+                )
+
+
+@check("normal_map_fixup")
+def check_normal_map_fixup():
+    """
+    Every 8-bit red and green pair of a DXT5N normal map goes through convert_normal_pixels, and through the per-pixel float
+    formula which used to be applied to the loaded Blender image, quantized the way Blender stores byte pixels.
+    """
+    from msfs_blender_tools.core.msfs_texture_decoder import MSFS_TextureDecoder
+
+    red, green = np.meshgrid(np.arange(256, dtype=np.uint8), np.arange(256, dtype=np.uint8), indexing="ij")
+    pixels = np.zeros((256, 256, 4), dtype=np.uint8)
+    pixels[..., 0] = red
+    pixels[..., 1] = green
+    pixels[..., 2] = 77 # Whatever blue the DDS holds is replaced
+    pixels[..., 3] = np.arange(256, dtype=np.uint8)
+
+    # Blender converted the loaded bytes to floats, then the fixup ran on them
+    expected = pixels.astype(np.float32) / np.float32(255)
+    rgb_pixels = expected[..., 0:3]
+    rgb_pixels[..., 1] = 1.0 - rgb_pixels[..., 1]
+    rgb_pixels[..., 2] = np.sqrt(1 - (rgb_pixels[..., 0] - 0.5) ** 2 - (rgb_pixels[..., 1] - 0.5) ** 2)
+    expected = np.clip(np.floor(expected * np.float32(255) + np.float32(0.5)), 0, 255).astype(np.uint8)
+
+    MSFS_TextureDecoder.convert_normal_pixels(pixels)
+
+    mismatches = np.argwhere(np.any(pixels != expected, axis=-1))
+    if len(mismatches):
+        r, g = mismatches[0]
+        raise AssertionError(
+            f"{len(mismatches)} red/green pairs differ, first red={r} green={g}: {pixels[r, g].tolist()} instead of {expected[r, g].tolist()}"
+        )
+
+
+def run_checks(name_filter=""):
+    """Runs the checks whose name contains name_filter, printing a line per check. Returns whether they all passed."""
+    passed = True
+    for name, func in CHECKS:
+        if name_filter not in name:
+            continue
+        try:
+            func()
+            print(f"check {name}: ok")
+        except AssertionError as e:
+            print(f"check {name}: FAILED, {e}")
+            passed = False
+    return passed
+
+
+def main(argv):
+    standins.install()
+    return 0 if run_checks(argv[0] if argv else "") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,335 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Generates synthetic ASOBO_asset_optimized fixtures laid out like a SimObject package (model/*.gltf + *.bin, TEXTURE/*.DDS):
+large shared vertex pools split into many primitives through BaseVertexIndex/StartIndex, BLEND1 skins, float16 "Short" accessors,
+sparse accessors and DXT5N normal maps. Fixtures are deterministic and only generated once per set of parameters.
+"""
+
+import io
+import os
+import json
+import struct
+import numpy as np
+
+# Bump whenever generated fixtures change, so fixtures generated by older versions are written again
+VERSION = 2
+
+COMPONENT_TYPES = {
+    np.dtype(np.int8): 5120,
+    np.dtype(np.uint8): 5121,
+    np.dtype(np.float16): 5122, # Asobo stores float16 data as "Short"
+    np.dtype(np.uint16): 5123,
+    np.dtype(np.uint32): 5125,
+    np.dtype(np.float32): 5126,
+}
+
+ACCESSOR_TYPES = {1: "SCALAR", 2: "VEC2", 3: "VEC3", 4: "VEC4"}
+
+
+class BinaryWriter:
+    """Collects arrays into a single .bin buffer, creating 4-byte aligned buffer views and accessors for them."""
+
+    def __init__(self):
+        self.chunks = []
+        self.length = 0
+        self.buffer_views = []
+        self.accessors = []
+
+    def add_buffer_view(self, array, byte_stride=None):
+        padding = -self.length % 4
+        if padding:
+            self.chunks.append(b"\0" * padding)
+            self.length += padding
+
+        data = np.ascontiguousarray(array).tobytes()
+        buffer_view = {"buffer": 0, "byteOffset": self.length, "byteLength": len(data)}
+        if byte_stride:
+            buffer_view["byteStride"] = byte_stride
+
+        self.chunks.append(data)
+        self.length += len(data)
+        self.buffer_views.append(buffer_view)
+        return len(self.buffer_views) - 1
+
+    def add_accessor(self, array, normalized=False, **properties):
+        array = array.reshape(len(array), -1)
+        accessor = {
+            "bufferView": self.add_buffer_view(array),
+            "byteOffset": 0,
+            "componentType": COMPONENT_TYPES[array.dtype],
+            "count": len(array),
+            "type": ACCESSOR_TYPES[array.shape[1]],
+        }
+        if normalized:
+            accessor["normalized"] = True
+        accessor.update(properties)
+
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+    def add_interleaved(self, arrays, normalized=()):
+        """
+        Interleaves arrays of the same length into a single strided buffer view, like Asobo vertex buffers, and adds an accessor for each.
+        Every attribute is aligned to its component size and the stride to 4 bytes. Returns the accessor indices, in the order of arrays.
+        """
+        arrays = [array.reshape(len(array), -1) for array in arrays]
+        offsets = []
+        offset = 0
+        for array in arrays:
+            offset += -offset % array.dtype.itemsize
+            offsets.append(offset)
+            offset += array.dtype.itemsize * array.shape[1]
+        stride = offset + -offset % 4
+
+        records = np.zeros(
+            len(arrays[0]),
+            dtype=np.dtype(
+                {
+                    "names": [f"f{idx}" for idx in range(len(arrays))],
+                    "formats": [(array.dtype, (array.shape[1],)) for array in arrays],
+                    "offsets": offsets,
+                    "itemsize": stride,
+                }
+            ),
+        )
+        for idx, array in enumerate(arrays):
+            records[f"f{idx}"] = array
+        buffer_view = self.add_buffer_view(records.view(np.uint8), byte_stride=stride)
+
+        accessor_indices = []
+        for idx, (array, offset) in enumerate(zip(arrays, offsets)):
+            accessor = {
+                "bufferView": buffer_view,
+                "byteOffset": offset,
+                "componentType": COMPONENT_TYPES[array.dtype],
+                "count": len(array),
+                "type": ACCESSOR_TYPES[array.shape[1]],
+            }
+            if idx in normalized:
+                accessor["normalized"] = True
+            self.accessors.append(accessor)
+            accessor_indices.append(len(self.accessors) - 1)
+
+        return accessor_indices
+
+
+def write_model(path, primitives=500, vertices_per_primitive=2000, triangles_per_primitive=3000, blend1=True, sparse=True, interleaved=False, seed=0):
+    """
+    Writes an Asobo-optimized glTF whose meshes all share one vertex pool and one index buffer.
+    With interleaved set, the vertex attributes share one strided buffer view, as in most sim models.
+    """
+    rng = np.random.default_rng(seed)
+    writer = BinaryWriter()
+    vertex_count = primitives * vertices_per_primitive
+
+    # One shared index buffer, every primitive indexes its own block of the shared vertex pool relative to its BaseVertexIndex
+    local_indices = rng.integers(0, vertices_per_primitive, size=(primitives, triangles_per_primitive * 3))
+    indices = writer.add_accessor(local_indices.astype(np.uint16 if vertices_per_primitive < 65535 else np.uint32).reshape(-1))
+
+    vertices = {
+        "POSITION": rng.standard_normal((vertex_count, 3), dtype=np.float32),
+        "NORMAL": rng.uniform(-1, 1, (vertex_count, 4)).astype(np.float16),
+        "TANGENT": rng.uniform(-1, 1, (vertex_count, 4)).astype(np.float16),
+        "TEXCOORD_0": rng.uniform(0, 1, (vertex_count, 2)).astype(np.float16),
+        "TEXCOORD_1": rng.uniform(0, 1, (vertex_count, 2)).astype(np.float16),
+        "COLOR_0": np.full((vertex_count, 4), 15360, dtype=np.uint16),
+    }
+    if blend1:
+        vertices["JOINTS_0"] = rng.integers(0, 64, (vertex_count, 1), dtype=np.uint8)
+        vertices["WEIGHTS_0"] = np.full((vertex_count, 1), 255, dtype=np.uint8)
+    normalized = {"WEIGHTS_0"}
+
+    if interleaved:
+        attributes = dict(
+            zip(
+                vertices,
+                writer.add_interleaved(
+                    list(vertices.values()),
+                    normalized=[idx for idx, attr in enumerate(vertices) if attr in normalized],
+                ),
+            )
+        )
+    else:
+        attributes = {attr: writer.add_accessor(array, normalized=attr in normalized) for attr, array in vertices.items()}
+
+    meshes = [
+        {
+            "name": f"Mesh_{idx}",
+            "primitives": [
+                {
+                    "attributes": attributes,
+                    "indices": indices,
+                    "extras": {
+                        "ASOBO_primitive": {
+                            "BaseVertexIndex": idx * vertices_per_primitive,
+                            "StartIndex": idx * triangles_per_primitive * 3,
+                            "PrimitiveCount": triangles_per_primitive,
+                            "VertexType": "BLEND1" if blend1 else "VANILLA",
+                        }
+                    },
+                }
+            ],
+        }
+        for idx in range(primitives)
+    ]
+
+    if sparse:
+        # A morph-like accessor: a zeroed base with a sparse set of overridden vertices
+        sparse_count = vertex_count // 10
+        sparse_indices = np.sort(rng.choice(vertex_count, sparse_count, replace=False)).astype(np.uint32)
+        writer.accessors.append(
+            {
+                "componentType": 5126,
+                "count": vertex_count,
+                "type": "VEC3",
+                "name": "sparse",
+                "sparse": {
+                    "count": sparse_count,
+                    "indices": {"bufferView": writer.add_buffer_view(sparse_indices), "componentType": 5125},
+                    "values": {"bufferView": writer.add_buffer_view(rng.standard_normal((sparse_count, 3), dtype=np.float32))},
+                },
+            }
+        )
+
+    add_normalized_accessors(writer, vertex_count, rng)
+    write_gltf(path, writer, meshes)
+
+
+def add_normalized_accessors(writer, vertex_count, rng):
+    """Adds normalized accessors as found in TEXCOORD/WEIGHTS/COLOR streams, named after their component type."""
+    normalized = {
+        np.int8: rng.integers(-128, 128, (vertex_count, 4)),
+        np.uint8: rng.integers(0, 256, (vertex_count, 4)),
+        np.uint16: rng.integers(0, 65536, (vertex_count, 4)),
+        np.float16: rng.uniform(-32767, 32767, (vertex_count, 4)),
+    }
+    for dtype, values in normalized.items():
+        writer.add_accessor(values.astype(dtype), normalized=True, name=f"normalized_{np.dtype(dtype).name}")
+
+
+def write_gltf(path, writer, meshes=()):
+    bin_name = os.path.splitext(os.path.basename(path))[0] + ".bin"
+    with open(os.path.join(os.path.dirname(path), bin_name), "wb") as f:
+        for chunk in writer.chunks:
+            f.write(chunk)
+
+    gltf = {
+        "asset": {"version": "2.0", "extensions": {"ASOBO_asset_optimized": {}}},
+        "extensionsUsed": ["ASOBO_asset_optimized", "MSFT_texture_dds"],
+        "buffers": [{"uri": bin_name, "byteLength": writer.length}],
+        "bufferViews": writer.buffer_views,
+        "accessors": writer.accessors,
+        "meshes": list(meshes),
+    }
+    with open(path, "w") as f:
+        json.dump(gltf, f)
+
+
+def write_accessors(path, vertex_count=4000000, seed=0):
+    """Writes a glTF holding only large normalized accessors, for benchmarks that need multi-million-vertex streams whatever the scale."""
+    writer = BinaryWriter()
+    add_normalized_accessors(writer, vertex_count, np.random.default_rng(seed))
+    write_gltf(path, writer)
+
+
+def encode_dds(image):
+    """Encodes a single-level DXT5 (BC3) DDS, falling back to uncompressed RGBA on Pillow versions that can't encode DXT5."""
+    data = io.BytesIO()
+    try:
+        image.save(data, format="DDS", pixel_format="DXT5")
+    except (TypeError, ValueError, OSError):
+        data = io.BytesIO()
+        image.save(data, format="DDS")
+    return data.getvalue()
+
+
+def write_dds(path, pixels):
+    """Writes a DDS with a full mip chain, like the textures of the sim. Pillow only writes single levels, so the levels are encoded one by one."""
+    from PIL import Image
+
+    image = Image.fromarray(pixels, "RGBA")
+    levels = [encode_dds(image)]
+    while max(image.size) > 1:
+        image = image.reduce(2) if min(image.size) > 1 else image.resize((max(1, image.width // 2), max(1, image.height // 2)))
+        levels.append(encode_dds(image))
+
+    # Keep the header of the first level, declaring the mip levels appended after it
+    header = bytearray(levels[0][:128])
+    flags, = struct.unpack_from("<I", header, 8)
+    caps, = struct.unpack_from("<I", header, 108)
+    struct.pack_into("<I", header, 8, flags | 0x20000) # DDSD_MIPMAPCOUNT
+    struct.pack_into("<I", header, 28, len(levels))
+    struct.pack_into("<I", header, 108, caps | 0x400008) # DDSCAPS_MIPMAP | DDSCAPS_COMPLEX
+
+    with open(path, "wb") as f:
+        f.write(header)
+        for level in levels:
+            f.write(level[128:])
+
+
+def write_textures(model_path, textures=16, size=1024, normal_ratio=0.5, seed=0):
+    """Writes DDS textures for a model and references them through MSFT_texture_dds. Part of them are flagged as DXT5N normal maps."""
+    rng = np.random.default_rng(seed)
+    textures_folder = os.path.join(os.path.dirname(os.path.dirname(model_path)), "TEXTURE")
+    os.makedirs(textures_folder, exist_ok=True)
+
+    # Smooth gradients with some noise, so the block compression has something realistic to encode
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    images = []
+    for idx in range(textures):
+        name = f"TEXTURE_{idx}.PNG.DDS"
+        noise = rng.integers(0, 32, (size, size, 4), dtype=np.uint8)
+        pixels = np.stack([x * 200, y * 200, (x + y) * 100, np.full_like(x, 223)], axis=-1).astype(np.uint8) + noise
+        write_dds(os.path.join(textures_folder, name), pixels)
+
+        if idx < textures * normal_ratio:
+            with open(os.path.join(textures_folder, name + ".json"), "w") as f:
+                json.dump({"Version": 2, "Flags": ["FL_BITMAP_COMPRESSION", "FL_BITMAP_TANGENT_DXT5N"]}, f)
+
+        images.append({"uri": name})
+
+    with open(model_path, "r") as f:
+        gltf = json.load(f)
+    gltf["images"] = images
+    gltf["textures"] = [{"extensions": {"MSFT_texture_dds": {"source": idx}}} for idx in range(textures)]
+    with open(model_path, "w") as f:
+        json.dump(gltf, f)
+
+
+def fixture(directory, name, textures=16, texture_size=1024, write=None, **model):
+    """
+    Returns the path of a fixture model, generating it first if it doesn't exist yet.
+    The model is written by write(path, **model), write_model by default.
+    """
+    parameters = dict(model, textures=textures, texture_size=texture_size)
+    package = os.path.join(
+        directory, name + "-" + "-".join(f"{key}{value}" for key, value in sorted(parameters.items()))
+    )
+    model_path = os.path.join(package, "model", name + ".gltf")
+
+    # Only consider the fixture generated once everything has been written, so interrupted runs start over
+    complete_marker = os.path.join(package, ".complete")
+    if not os.path.exists(complete_marker) or open(complete_marker).read() != str(VERSION):
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        (write or write_model)(model_path, **model)
+        if textures:
+            write_textures(model_path, textures, texture_size)
+        with open(complete_marker, "w") as f:
+            f.write(str(VERSION))
+
+    return model_path
@@ -0,0 +1,354 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Offline benchmarks for the MSFS decoding paths, run without Blender against synthetic fixtures:
+    python benchmarks/run.py [--scale small|medium|large] [--filter decode_primitive] [--history benchmarks/history.jsonl]
+Every run is appended to the history file together with the current commit, and compared against the previous run of the same scale.
+The equivalence checks of checks.py run first, a failing check stops the run.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import platform
+import subprocess
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import checks
+import fixtures
+import standins
+
+SCALES = {
+    "small": dict(primitives=50, vertices_per_primitive=1000, triangles_per_primitive=1500, textures=4, texture_size=256),
+    "medium": dict(primitives=500, vertices_per_primitive=2000, triangles_per_primitive=3000, textures=16, texture_size=1024),
+    "large": dict(primitives=2000, vertices_per_primitive=4000, triangles_per_primitive=6000, textures=64, texture_size=2048),
+}
+
+BENCHMARKS = []
+
+# Fixture directory and fixture parameters of the scale being run, set by main
+FIXTURES = {}
+
+
+def benchmark(name, items):
+    """Registers a benchmark. items(gltf) returns the number of work items (primitives, textures...) one run processes."""
+
+    def decorator(func):
+        BENCHMARKS.append((name, items, func))
+        return func
+
+    return decorator
+
+
+def load_gltf(model_path):
+    gltf = standins.GLTFImporter(model_path)
+    for buffer_idx in range(len(gltf.data.buffers)):
+        gltf.load_buffer(buffer_idx)
+    return gltf
+
+
+def load_fixture(name, **parameters):
+    """Loads a fixture other than the main one, generated next to it. Parameters default to those of the current scale."""
+    return load_gltf(fixtures.fixture(FIXTURES["directory"], name, **dict(FIXTURES["parameters"], **parameters)))
+
+
+def asobo_primitives(gltf):
+    return [
+        (gltf_mesh, gltf_prim)
+        for gltf_mesh in gltf.data.meshes
+        for gltf_prim in gltf_mesh.primitives
+        if gltf_prim.extras and "ASOBO_primitive" in gltf_prim.extras
+    ]
+
+
+def named_accessor(gltf, name):
+    return next(accessor for accessor in gltf.data.accessors if accessor.name == name)
+
+
+def decode_indices_benchmark(baseline):
+    def setup(gltf):
+        from msfs_blender_tools.core.msfs_binary import MSFS_Binary
+        from msfs_blender_tools.core.msfs_primitive_decoder import MSFS_PrimitiveDecoder
+
+        primitives = asobo_primitives(gltf)
+        indices = MSFS_Binary.decode_accessor_obj(gltf, gltf.data.accessors[primitives[0][1].indices]).reshape(-1)
+        decode_indices = checks.baseline_decode_indices if baseline else MSFS_PrimitiveDecoder.decode_indices
+
+        def run():
+            for _, gltf_prim in primitives:
+                extension = gltf_prim.extras["ASOBO_primitive"]
+                decode_indices(indices, extension["StartIndex"], extension["PrimitiveCount"], extension["BaseVertexIndex"])
+
+        return run
+
+    return setup
+
+
+benchmark("decode_indices", lambda gltf: len(asobo_primitives(gltf)))(decode_indices_benchmark(False))
+# The per-index Python loop the vectorized path replaced, for comparison
+benchmark("decode_indices[baseline loop]", lambda gltf: len(asobo_primitives(gltf)))(decode_indices_benchmark(True))
+
+
+def decode_primitives_benchmark(vertex_compaction, prepass, interleaved=False, constant_attributes="SHARE"):
+    def setup(gltf):
+        if interleaved:
+            gltf = load_fixture("asobo", interleaved=True)
+
+        from msfs_blender_tools.core.msfs_binary import MSFS_Binary
+        from msfs_blender_tools.core.msfs_executor import MSFS_Executor
+        from msfs_blender_tools.core.msfs_primitive_decoder import MSFS_PrimitiveDecoder
+        from msfs_blender_tools.io.msfs_primitive import MSFS_Primitive
+
+        def run():
+            # The hooks modify the glTF, so every run decodes a fresh copy
+            fresh = standins.GLTFImporter(gltf.filename)
+            MSFS_Binary.map_buffers(fresh)
+            MSFS_Binary.create_accessor_cache(fresh, 1024 * 1024 * 1024, MSFS_PrimitiveDecoder.find_shared_accessors(fresh))
+            if prepass:
+                MSFS_Primitive.decode_primitives(
+                    fresh, vertex_compaction, MSFS_Executor.get("primitive", os.cpu_count()), constant_attributes
+                )
+            for gltf_mesh, gltf_prim in asobo_primitives(fresh):
+                MSFS_Primitive.decode_primitive(fresh, gltf_mesh, gltf_prim, vertex_compaction, constant_attributes)
+
+        return run
+
+    return setup
+
+
+for vertex_compaction in ("NONE", "RANGE", "UNIQUE"):
+    for prepass in (False, True):
+        benchmark(
+            f"decode_primitive[{vertex_compaction}{', prepass' if prepass else ''}]",
+            lambda gltf: len(asobo_primitives(gltf)),
+        )(decode_primitives_benchmark(vertex_compaction, prepass))
+
+# Vertex attributes interleaved in a single strided buffer view, as in most sim models
+for vertex_compaction in ("NONE", "UNIQUE"):
+    benchmark(
+        f"decode_primitive[{vertex_compaction}, prepass, interleaved]",
+        lambda gltf: len(asobo_primitives(gltf)),
+    )(decode_primitives_benchmark(vertex_compaction, True, interleaved=True))
+
+# Constant vertex colors left out of the meshes instead of shared
+for vertex_compaction in ("NONE", "UNIQUE"):
+    benchmark(
+        f"decode_primitive[{vertex_compaction}, prepass, drop constants]",
+        lambda gltf: len(asobo_primitives(gltf)),
+    )(decode_primitives_benchmark(vertex_compaction, True, constant_attributes="DROP"))
+
+
+def open_buffers_benchmark(mapped):
+    def setup(gltf):
+        from msfs_blender_tools.core.msfs_binary import MSFS_Binary
+
+        def run():
+            # Decoding the first accessor of a fresh import, which has to load or map the whole .bin first
+            fresh = standins.GLTFImporter(gltf.filename)
+            if mapped:
+                MSFS_Binary.map_buffers(fresh)
+            MSFS_Binary.decode_accessor_obj(fresh, named_accessor(fresh, "sparse"))
+
+        return run
+
+    return setup
+
+
+for mapped in (False, True):
+    benchmark(f"open_buffers[{'mmap' if mapped else 'load'}]", lambda gltf: 1)(open_buffers_benchmark(mapped))
+
+
+@benchmark("decode_accessor[sparse]", lambda gltf: named_accessor(gltf, "sparse").count)
+def bench_decode_sparse(gltf):
+    from msfs_blender_tools.core.msfs_binary import MSFS_Binary
+
+    accessor = named_accessor(gltf, "sparse")
+    return lambda: MSFS_Binary.decode_accessor_obj(gltf, accessor)
+
+
+def decode_normalized_benchmark(name):
+    def setup(gltf):
+        from msfs_blender_tools.core.msfs_binary import MSFS_Binary
+
+        accessor = named_accessor(gltf, name)
+        return lambda: MSFS_Binary.decode_accessor_obj(gltf, accessor)
+
+    return setup
+
+
+for dtype in ("int8", "uint8", "uint16", "float16"):
+    benchmark(f"decode_accessor[normalized_{dtype}]", lambda gltf, dtype=dtype: named_accessor(gltf, f"normalized_{dtype}").count)(
+        decode_normalized_benchmark(f"normalized_{dtype}")
+    )
+
+
+LARGE_ACCESSOR_VERTICES = 4000000
+
+
+def decode_large_normalized_benchmark(name):
+    def setup(gltf):
+        large_accessors = load_gltf(
+            fixtures.fixture(
+                FIXTURES["directory"], "accessors", textures=0, texture_size=0, write=fixtures.write_accessors, vertex_count=LARGE_ACCESSOR_VERTICES
+            )
+        )
+        return decode_normalized_benchmark(name)(large_accessors)
+
+    return setup
+
+
+# Same accessors at a fixed multi-million-vertex size, whatever the scale
+for dtype in ("int8", "uint8", "uint16", "float16"):
+    benchmark(f"decode_accessor[normalized_{dtype}, 4M]", lambda gltf: LARGE_ACCESSOR_VERTICES)(
+        decode_large_normalized_benchmark(f"normalized_{dtype}")
+    )
+
+
+def convert_textures_benchmark(workers, max_size=0):
+    def setup(gltf):
+        from msfs_blender_tools.core.msfs_settings import MSFS_Settings
+        from msfs_blender_tools.core.msfs_texture_decoder import MSFS_TextureDecoder
+
+        settings = MSFS_Settings(texture_workers=workers, texture_cache_enabled=False)
+
+        def run():
+            fresh = standins.GLTFImporter(gltf.filename)
+            conversions = MSFS_TextureDecoder.find_conversions(fresh, settings)
+            for _ in MSFS_TextureDecoder.decode_conversions(conversions, settings, max_size=max_size):
+                pass
+
+        return run
+
+    return setup
+
+
+for workers in (1, 0):
+    benchmark(f"convert_textures[workers={workers or 'auto'}]", lambda gltf: len(gltf.data.textures))(
+        convert_textures_benchmark(workers)
+    )
+
+# Proxy textures read from a reduced mip level
+for max_size in (512, 128):
+    benchmark(f"convert_textures[max_size={max_size}]", lambda gltf: len(gltf.data.textures))(
+        convert_textures_benchmark(0, max_size)
+    )
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_run(history_path, scale):
+    if not os.path.exists(history_path):
+        return None
+
+    previous = None
+    with open(history_path, "r") as f:
+        for line in f:
+            run = json.loads(line)
+            if run["scale"] == scale:
+                previous = run
+    return previous
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the MSFS decoding paths against synthetic fixtures")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark, the fastest run is reported")
+    parser.add_argument("--fixtures", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures"))
+    parser.add_argument("--history", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.jsonl"))
+    args = parser.parse_args(argv)
+
+    standins.install()
+    if not checks.run_checks():
+        return 1
+
+    FIXTURES.update(directory=args.fixtures, parameters=SCALES[args.scale])
+    model_path = fixtures.fixture(args.fixtures, "asobo", **SCALES[args.scale])
+    gltf = load_gltf(model_path)
+
+    previous = previous_run(args.history, args.scale)
+    results = {}
+
+    print(f"{'Benchmark':<40}  {'Best (s)':>9}  {'Mean (s)':>9}  {'Items':>8}  {'Per item (us)':>13}  {'Peak (MB)':>9}  {'Change':>8}")
+    for name, items, setup in BENCHMARKS:
+        if args.filter not in name:
+            continue
+
+        run = setup(gltf)
+        timings = []
+        # The decoders log every primitive to the console, which would otherwise drown the table
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+
+            # One more run to measure the allocation peak, tracing slows the code down too much to time it at the same time
+            tracemalloc.start()
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        count = items(gltf)
+        results[name] = {"best": min(timings), "mean": sum(timings) / len(timings), "items": count, "peak": peak}
+
+        change = ""
+        if previous is not None and name in previous["results"]:
+            change = f"{(min(timings) / previous['results'][name]['best'] - 1) * 100:+.1f}%"
+        print(
+            f"{name:<40}  {min(timings):>9.4f}  {results[name]['mean']:>9.4f}  {count:>8}  "
+            f"{min(timings) / max(count, 1) * 1e6:>13.2f}  {peak / (1024 * 1024):>9.1f}  {change:>8}"
+        )
+
+    with open(args.history, "a") as f:
+        f.write(
+            json.dumps(
+                {
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "commit": git_commit(),
+                    "scale": args.scale,
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "machine": platform.platform(),
+                    "results": results,
+                }
+            )
+            + "\n"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,126 @@
+# msfs-blender-tools
+# Copyright (C) 2022 FlyByWire Simulations
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Lightweight stand-ins for the parts of the Khronos glTF importer (io_scene_gltf2) the add-on relies on, so the bpy-free core
+and the primitive adapter can be loaded and timed outside of Blender.
+The stand-ins mirror the Khronos behaviour that matters for performance, such as buffers being loaded whole on first use.
+"""
+
+import os
+import re
+import sys
+import json
+import types
+
+ADDON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "addons", "msfs-blender-tools")
+ADDON_PACKAGE = "msfs_blender_tools"
+
+
+def snake_case(name):
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+
+class GLTFObject:
+    """Generic glTF property: camelCase JSON keys become snake_case attributes, missing properties read as None."""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return None
+
+    @classmethod
+    def from_dict(cls, obj):
+        return cls(**{snake_case(key): GLTFObject.wrap(value) for key, value in obj.items()})
+
+    @staticmethod
+    def wrap(value):
+        # Only nested glTF properties used by the decoders are turned into objects, extensions and extras stay dictionaries
+        if isinstance(value, dict) and ("bufferView" in value or "indices" in value):
+            return GLTFObject.from_dict(value)
+        return value
+
+
+class Accessor(GLTFObject):
+    def __init__(self, **kwargs):
+        GLTFObject.__init__(self, **kwargs)
+
+
+class BufferView(GLTFObject):
+    pass
+
+
+class GLTFImporter:
+    """Stand-in for the Khronos glTFImporter object handed to the import hooks."""
+
+    def __init__(self, filepath):
+        self.filename = filepath
+        self.import_settings = {"filepath": filepath}
+        self.buffers = {}
+        self.decode_accessor_cache = {}
+
+        with open(filepath, "r") as f:
+            data = json.load(f)
+
+        self.data = GLTFObject(
+            asset=GLTFObject.from_dict(data["asset"]),
+            buffers=[GLTFObject.from_dict(buffer) for buffer in data.get("buffers", [])],
+            buffer_views=[BufferView.from_dict(view) for view in data.get("bufferViews", [])],
+            accessors=[Accessor.from_dict(accessor) for accessor in data.get("accessors", [])],
+            images=[GLTFObject.from_dict(image) for image in data.get("images", [])],
+            textures=[GLTFObject.from_dict(texture) for texture in data.get("textures", [])],
+            meshes=[
+                GLTFObject(
+                    name=mesh.get("name"),
+                    primitives=[
+                        GLTFObject(
+                            attributes=dict(primitive["attributes"]),
+                            indices=primitive.get("indices"),
+                            extras=primitive.get("extras"),
+                            material=primitive.get("material"),
+                        )
+                        for primitive in mesh["primitives"]
+                    ],
+                )
+                for mesh in data.get("meshes", [])
+            ],
+        )
+
+    def load_buffer(self, buffer_idx):
+        with open(os.path.join(os.path.dirname(self.filename), self.data.buffers[buffer_idx].uri), "rb") as f:
+            self.buffers[buffer_idx] = f.read()
+
+
+def install():
+    """Registers the stand-in modules, and the add-on package without running its __init__, which needs Blender."""
+
+    def module(name, **attributes):
+        mod = types.ModuleType(name)
+        mod.__dict__.update(attributes)
+        sys.modules[name] = mod
+        return mod
+
+    module("io_scene_gltf2", __path__=[])
+    module("io_scene_gltf2.io", __path__=[])
+    module("io_scene_gltf2.io.com", __path__=[])
+    module("io_scene_gltf2.io.com.gltf2_io", Accessor=Accessor, BufferView=BufferView)
+    module("io_scene_gltf2.io.com.gltf2_io_debug", print_console=lambda level, message: None)
+    sys.modules["io_scene_gltf2.io.com"].gltf2_io_debug = sys.modules["io_scene_gltf2.io.com.gltf2_io_debug"]
+
+    module(ADDON_PACKAGE, __path__=[ADDON_DIR])